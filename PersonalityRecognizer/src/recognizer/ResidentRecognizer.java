@@ -0,0 +1,214 @@
+package recognizer;
+
+import java.io.*;
+import java.util.Collections;
+import java.util.Enumeration;
+import java.util.LinkedHashMap;
+import java.util.LinkedHashSet;
+import java.util.Map;
+import java.util.Properties;
+import java.util.Set;
+
+import weka.classifiers.Classifier;
+import weka.core.Attribute;
+import weka.core.Instance;
+import weka.core.Instances;
+import weka.filters.Filter;
+import weka.filters.unsupervised.attribute.Standardize;
+
+/**
+ * Resident version of the corpus analysis mode (-d) of the Personality
+ * Recognizer. The models are loaded once, then documents are read from the
+ * standard input and scored on request, so that new documents can be scored
+ * without starting a new JVM or rescanning a directory. As in the corpus
+ * analysis mode, features are standardized over all the documents received
+ * since the start (or the last reset).
+ *
+ * <p>
+ * Protocol, one command per line on the standard input:
+ * <ul>
+ * <li><code>DOC &lt;tab&gt; id &lt;tab&gt; text</code>: adds (or replaces) a
+ * document, where backslashes, tabs and line breaks in the text are escaped as
+ * <code>\\</code>, <code>\t</code>, <code>\n</code> and <code>\r</code>;</li>
+ * <li><code>SCORE</code>: writes the scores of the documents added since the
+ * last <code>SCORE</code>, <code>SCORE ALL</code> writes the scores of all the
+ * documents;</li>
+ * <li><code>RESET</code>: forgets all the documents;</li>
+ * <li><code>QUIT</code>: exits.</li>
+ * </ul>
+ * Scores are written as <code>id &lt;tab&gt; Extra &lt;tab&gt; Emoti &lt;tab&gt;
+ * Agree &lt;tab&gt; Consc &lt;tab&gt; Openn</code> lines, or
+ * <code>ERROR &lt;tab&gt; id &lt;tab&gt; message</code> for the documents whose
+ * features could not be computed, followed by a line <code>END</code>. The line
+ * <code>READY</code> is written once the models are loaded. Options are the
+ * same as the -m and -t options of the PersonalityRecognizer class.
+ */
+public class ResidentRecognizer {
+
+	private PersonalityRecognizer recognizer;
+
+	private Classifier[] models;
+
+	/** Empty dataset with the attributes of the standardized models. */
+	private Instances header;
+
+	/** Feature counts of each document, in the order they were received. */
+	private Map<String, Map<String, Double>> counts = new LinkedHashMap<String, Map<String, Double>>();
+
+	/** Documents received since the last SCORE command. */
+	private Set<String> pending = new LinkedHashSet<String>();
+
+	/** Documents whose features could not be computed, with the error message. */
+	private Map<String, String> errors = new LinkedHashMap<String, String>();
+
+	public ResidentRecognizer(int modelIndex, boolean selfModel) throws Exception {
+		recognizer = new PersonalityRecognizer(PersonalityRecognizer.DEFAULT_CONFIG_FILE);
+		recognizer.setModel(modelIndex);
+		models = recognizer.loadWekaModels(selfModel, true);
+
+		Properties properties = new Properties();
+		properties.load(new FileInputStream(PersonalityRecognizer.DEFAULT_CONFIG_FILE));
+		File attributeFile = new File(properties.getProperty("appDir") + PersonalityRecognizer.FS + "lib"
+				+ PersonalityRecognizer.FS + "attributes-info.arff");
+		header = new Instances(new BufferedReader(new FileReader(attributeFile)), 1);
+		header.setClassIndex(header.numAttributes() - 1);
+	}
+
+	public static void main(String[] args) {
+		int modelIndex = 3;
+		boolean selfModel = false;
+		for (int i = 0; i < args.length - 1; i++) {
+			if (args[i].equals("-m")) {
+				modelIndex = Integer.parseInt(args[i + 1]) - 1;
+			} else if (args[i].equals("-t")) {
+				selfModel = args[i + 1].equals("2");
+			}
+		}
+
+		try {
+			ResidentRecognizer resident = new ResidentRecognizer(modelIndex, selfModel);
+			BufferedReader in = new BufferedReader(new InputStreamReader(System.in, "UTF-8"));
+			PrintStream out = new PrintStream(new BufferedOutputStream(new FileOutputStream(FileDescriptor.out)),
+					false, "UTF-8");
+			out.println("READY");
+			out.flush();
+
+			String line;
+			while ((line = in.readLine()) != null) {
+				if (line.startsWith("DOC\t")) {
+					String[] fields = line.split("\t", 3);
+					resident.addDocument(fields[1], fields.length > 2 ? unescape(fields[2]) : "");
+				} else if (line.equals("SCORE") || line.equals("SCORE ALL")) {
+					resident.score(line.equals("SCORE ALL"), out);
+					out.println("END");
+					out.flush();
+				} else if (line.equals("RESET")) {
+					resident.reset();
+				} else if (line.equals("QUIT")) {
+					break;
+				} else if (line.length() > 0) {
+					System.err.println("Warning: unknown command " + line);
+				}
+			}
+			out.flush();
+		} catch (Exception e) {
+			e.printStackTrace();
+			System.exit(1);
+		}
+	}
+
+	/**
+	 * Computes the feature counts of a document, the personality scores are
+	 * computed on request by score().
+	 */
+	public void addDocument(String id, String text) {
+		pending.add(id);
+		errors.remove(id);
+		try {
+			counts.put(id, recognizer.getFeatureCounts(text, false));
+		} catch (Exception e) {
+			counts.remove(id);
+			errors.put(id, String.valueOf(e.getMessage()).replaceAll("\\s+", " "));
+		}
+	}
+
+	/**
+	 * Standardizes the features over all the documents, and writes the scores
+	 * of the pending documents (or all of them).
+	 */
+	public void score(boolean all, PrintStream out) throws Exception {
+		for (String id : errors.keySet()) {
+			if (all || pending.contains(id)) {
+				out.println("ERROR\t" + id + "\t" + errors.get(id));
+			}
+		}
+		if (!counts.isEmpty()) {
+			Instances dataset = new Instances(header, counts.size());
+			for (Map<String, Double> docCounts : counts.values()) {
+				addInstance(dataset, docCounts);
+			}
+			Standardize stdFilter = new Standardize();
+			stdFilter.setInputFormat(dataset);
+			dataset = Filter.useFilter(dataset, stdFilter);
+
+			int c = 0;
+			for (String id : counts.keySet()) {
+				if (all || pending.contains(id)) {
+					out.print(id);
+					for (int i = 0; i < models.length; i++) {
+						out.print("\t" + weka.core.Utils.doubleToString(models[i].classifyInstance(dataset.instance(c)), 3));
+					}
+					out.println();
+				}
+				c++;
+			}
+		}
+		pending.clear();
+	}
+
+	public void reset() {
+		counts.clear();
+		pending.clear();
+		errors.clear();
+	}
+
+	/**
+	 * Adds an instance with the given feature counts to the dataset, as done in
+	 * the corpus analysis mode of the PersonalityRecognizer class.
+	 */
+	private void addInstance(Instances dataset, Map<String, Double> docCounts) {
+		Instance inst = new Instance(docCounts.size() + 1);
+		inst.setDataset(dataset);
+		for (Attribute attr : Collections.list((Enumeration<Attribute>) dataset.enumerateAttributes())) {
+			if (docCounts.containsKey(attr.name().toUpperCase())) {
+				inst.setValue(attr, docCounts.get(attr.name().toUpperCase()));
+			} else {
+				inst.setMissing(attr);
+			}
+		}
+		inst.setClassMissing();
+		dataset.add(inst);
+	}
+
+	private static String unescape(String text) {
+		StringBuilder sb = new StringBuilder(text.length());
+		for (int i = 0; i < text.length(); i++) {
+			char ch = text.charAt(i);
+			if (ch == '\\' && i + 1 < text.length()) {
+				char next = text.charAt(++i);
+				if (next == 'n') {
+					sb.append('\n');
+				} else if (next == 'r') {
+					sb.append('\r');
+				} else if (next == 't') {
+					sb.append('\t');
+				} else {
+					sb.append(next);
+				}
+			} else {
+				sb.append(ch);
+			}
+		}
+		return sb.toString();
+	}
+}
@@ -0,0 +1,109 @@
+"""
+Import time of the entry points of the pipeline, i.e., the start-up cost paid by every process running a script or
+a worker. Each module is imported in a fresh interpreter, and the best wall time out of --repeat runs is reported,
+along with the heavy libraries loaded by the import. With --baseline, the same modules are also imported from the
+src directory of a git revision, to show the gain.
+
+Usage: python benchmarks/import_time.py [options] [module ...]
+Modules whose dependencies are missing are reported as skipped.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+ENTRY_POINTS = ('utils.math', 'utils.plot', 'utils.email', 'utils.email.email_utils', 'pr', 'ibmpi', 'liwc', 'tp',
+                'data_preparation', 'phase1_analysis', 'pipeline')
+HEAVY_MODULES = ('matplotlib', 'scipy', 'statsmodels', 'sklearn', 'nltk', 'rpy2', 'bs4', 'cleantext', 'polyglot',
+                 'joblib')
+REPEAT = 5
+OUTPUT_DIR = 'results/benchmarks'
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def import_time(module, src_dir, repeat):
+    """Best import time of module out of repeat fresh interpreters, None with the error if it cannot be imported"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(['.', src_dir, os.path.join('.', 'twitpersonality')]),
+               MPLBACKEND='Agg')
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, '-c', _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                              env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            errors = proc.stderr.strip().splitlines()
+            return None, errors[-1] if errors else 'exit code {}'.format(proc.returncode)
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    return best, None
+
+
+def export_src(revision, directory):
+    """Extracts the src directory of a git revision into directory and returns its path"""
+    archive = os.path.join(directory, 'src.tar')
+    subprocess.run(['git', 'archive', '--output', archive, revision, 'src'], check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(directory)
+    return os.path.join(directory, 'src')
+
+
+def measure(modules, src_dir, repeat, label):
+    results = dict()
+    for module in modules:
+        result, error = import_time(module, src_dir, repeat)
+        if result is None:
+            results[module] = {'skipped': error}
+            print('  {:10} {:28} skipped ({})'.format(label, module, error))
+        else:
+            results[module] = result
+            print('  {:10} {:28} {:8.3f}s  {}'.format(label, module, result['seconds'], ', '.join(result['loaded'])))
+    return results
+
+
+def print_table(current, baseline):
+    header = '\n{:28}{:>12}'.format('Module', 'current')
+    print(header + ('{:>12}{:>10}'.format('baseline', 'speedup') if baseline else ''))
+    for module, result in current.items():
+        line = '{:28}'.format(module) + ('{:>12}'.format('skipped') if 'skipped' in result
+                                         else '{:11.3f}s'.format(result['seconds']))
+        if baseline:
+            base = baseline[module]
+            line += '{:>12}'.format('skipped') if 'skipped' in base else '{:11.3f}s'.format(base['seconds'])
+            if 'skipped' not in result and 'skipped' not in base and result['seconds'] > 0:
+                line += '{:>9.1f}x'.format(base['seconds'] / result['seconds'])
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures the import time of the entry points.')
+    parser.add_argument('modules', nargs='*', help='modules to import, by default: ' + ', '.join(ENTRY_POINTS))
+    parser.add_argument('--repeat', type=int, default=REPEAT, help='imports per module, the best time is kept')
+    parser.add_argument('--baseline', default=None, help='git revision to compare with, e.g., HEAD~1')
+    parser.add_argument('--output', default=None, help='JSON report, by default in ' + OUTPUT_DIR)
+    args = parser.parse_args()
+    modules = args.modules or list(ENTRY_POINTS)
+
+    current = measure(modules, os.path.join('.', 'src'), args.repeat, 'current')
+    baseline = None
+    if args.baseline:
+        with tempfile.TemporaryDirectory(prefix='import-time-') as tmp_dir:
+            baseline = measure(modules, export_src(args.baseline, tmp_dir), args.repeat, args.baseline)
+    print_table(current, baseline)
+
+    output = args.output or os.path.join(OUTPUT_DIR, 'import-time-' + time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(file=output, mode='w') as js_f:
+        json.dump({'repeat': args.repeat, 'baseline': args.baseline, 'current': current,
+                   'baseline_results': baseline}, js_f, indent=4)
+    print('Report written to {}'.format(output))
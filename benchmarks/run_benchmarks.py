@@ -0,0 +1,258 @@
+"""
+Benchmarks of the cleaning and scoring paths on synthetic corpora of increasing size (see synthetic.py). Each scale
+is generated in a temporary directory, used as working directory, so the dataset and results directories of the
+repository are never touched. For each benchmark, the best wall time out of --repeat runs is reported at each scale,
+along with the exponent of the scaling curve (slope of log time over log items: ~1 is linear).
+
+Usage: PYTHONPATH=./src:./benchmarks python benchmarks/run_benchmarks.py [options] [benchmark ...]
+Benchmarks whose dependencies are missing (e.g., R for the email cleaning) are reported as skipped.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+import numpy as np
+
+import synthetic
+
+# Number of senders of each scale
+SCALES = (50, 200, 1000)
+MESSAGES_PER_SENDER = 10
+REPEAT = 3
+OUTPUT_DIR = 'results/benchmarks'
+
+
+class Context:
+    """Synthetic data of a scale, generated in the current working directory"""
+
+    def __init__(self, n_senders, messages_per_sender, args):
+        self.raw_corpus = synthetic.generate_corpus(n_senders, messages_per_sender, args.words,
+                                                    args.code_share, args.reply_share, args.html_share)
+        self.corpus = synthetic.write_dataset(self.raw_corpus)
+        self.senders = set(self.corpus)
+        self.hashes = list(self.corpus)
+
+
+# Each benchmark returns the function to time and the number of items it processes
+
+def _get_mail_corpus(ctx):
+    from utils.email import email_utils
+    return lambda: email_utils.get_mail_corpus(cache_path=None), len(ctx.raw_corpus)
+
+
+def _dedup(ctx):
+    from utils.email.dedup import Deduplicator
+
+    def dedup():
+        deduplicator = Deduplicator()
+        return sum(deduplicator.is_duplicate(d['email_address'], d['message_body']) for d in ctx.raw_corpus)
+    return dedup, len(ctx.raw_corpus)
+
+
+def _data_preparation(ctx):
+    import data_preparation
+    return lambda: data_preparation.run(ctx.senders, ctx.corpus), len(ctx.raw_corpus)
+
+
+def _data_preparation_packed(ctx):
+    import data_preparation
+    return lambda: data_preparation.run(ctx.senders, ctx.corpus, pack=True), len(ctx.raw_corpus)
+
+
+def _big5_scores(ctx):
+    import liwc
+    raw = synthetic.liwc_output(ctx.hashes, liwc.big5_weights('2007').index)
+    return lambda: liwc.compute_big5_scores(raw['Source (A)'], raw, '2007'), len(ctx.hashes)
+
+
+def _parse_results_table(ctx):
+    import pr
+    lines = synthetic.recognizer_output(ctx.hashes)
+    return lambda: pr.parse_results_table(lines), len(ctx.hashes)
+
+
+def _rescale(ctx):
+    from utils import math as math_utils
+    scores = synthetic.tool_scores(ctx.hashes)
+    return lambda: math_utils.rescale(scores, old_min=1, old_max=7), len(ctx.hashes)
+
+
+def _gold_standard_store(ctx):
+    from utils import io as io_utils
+    return lambda: io_utils.load_gold_standard_store().join(synthetic.tool_scores(ctx.hashes)), len(ctx.hashes)
+
+
+def _mail_corpus(ctx):
+    from utils import io as io_utils
+    io_utils.load_mail_corpus()
+    return lambda: sum(len(messages) for _, messages in io_utils.load_mail_corpus().items()), len(ctx.raw_corpus)
+
+
+def _evaluate(ctx):
+    from utils import io as io_utils
+    from utils import math as math_utils
+    scores = synthetic.tool_scores(ctx.hashes)
+    gold_std = io_utils.load_gold_standard()
+    return lambda: math_utils.evaluate(scores, gold_std), len(ctx.hashes)
+
+
+def _evaluate_bootstrap(ctx):
+    from utils import io as io_utils
+    from utils import math as math_utils
+    scores = synthetic.tool_scores(ctx.hashes)
+    gold_std = io_utils.load_gold_standard_store()
+    return lambda: math_utils.evaluate(scores, gold_std, n_boot=1000, seed=0), len(ctx.hashes)
+
+
+def _mailcorpus_stats(ctx):
+    import phase1_analysis
+    return lambda: phase1_analysis.mailcorpus_stats(ctx.corpus), len(ctx.raw_corpus)
+
+
+def _phase1_scores(ctx):
+    import phase1_analysis
+    from utils import io as io_utils
+    tool_results = {tool: synthetic.tool_scores(ctx.hashes, seed=i) for i, tool in enumerate(phase1_analysis.TOOLS)}
+    scores, tools = phase1_analysis.build_scores(tool_results, io_utils.load_gold_standard())
+    return phase1_analysis, scores, tools
+
+
+def _warmed_up(func):
+    """Calls func once before it is timed, so that the libraries it imports on first use, e.g., SciPy, are not timed"""
+    func()
+    return func
+
+
+def _descriptive_stats(ctx):
+    phase1_analysis, scores, tools = _phase1_scores(ctx)
+    return lambda: phase1_analysis.descriptive_stats(scores, tools), len(ctx.hashes)
+
+
+def _normality_test(ctx):
+    phase1_analysis, scores, tools = _phase1_scores(ctx)
+    return _warmed_up(lambda: phase1_analysis.normality_test(scores, tools)), len(ctx.hashes)
+
+
+def _pairwise_correlations(ctx):
+    phase1_analysis, scores, tools = _phase1_scores(ctx)
+    return _warmed_up(lambda: phase1_analysis.pairwise_correlations(scores, tools, method='spearman')), \
+        len(ctx.hashes)
+
+
+def _save_plots(ctx):
+    phase1_analysis, scores, tools = _phase1_scores(ctx)
+    return _warmed_up(lambda: phase1_analysis.save_plots(scores, tools, manifest_path=None)), len(ctx.hashes)
+
+
+BENCHMARKS = {
+    'email_utils.get_mail_corpus': _get_mail_corpus,
+    'email.dedup': _dedup,
+    'data_preparation.run': _data_preparation,
+    'data_preparation.run[pack]': _data_preparation_packed,
+    'liwc.compute_big5_scores': _big5_scores,
+    'pr.parse_results_table': _parse_results_table,
+    'math.rescale': _rescale,
+    'io.GoldStandard.join': _gold_standard_store,
+    'io.MailCorpus.items': _mail_corpus,
+    'math.evaluate': _evaluate,
+    'math.evaluate[bootstrap]': _evaluate_bootstrap,
+    'phase1.mailcorpus_stats': _mailcorpus_stats,
+    'phase1.descriptive_stats': _descriptive_stats,
+    'phase1.normality_test': _normality_test,
+    'phase1.pairwise_correlations': _pairwise_correlations,
+    'phase1.save_plots': _save_plots,
+}
+
+
+def best_time(func, repeat):
+    times = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def scaling_exponent(points):
+    """Slope of the log-log curve of the time over the number of items, None with less than two scales"""
+    points = [p for p in points if p['seconds'] > 0]
+    if len(points) < 2:
+        return None
+    slope, _ = np.polyfit(np.log([p['items'] for p in points]), np.log([p['seconds'] for p in points]), 1)
+    return round(float(slope), 2)
+
+
+def run_benchmarks(names, scales, messages_per_sender, repeat, args):
+    results = {name: {'points': list(), 'skipped': None} for name in names}
+    cwd = os.getcwd()
+    for n_senders in scales:
+        with tempfile.TemporaryDirectory(prefix='bench-') as tmp_dir:
+            os.chdir(tmp_dir)
+            try:
+                print('Scale: {} senders x {} messages'.format(n_senders, messages_per_sender))
+                ctx = Context(n_senders, messages_per_sender, args)
+                for name in names:
+                    if results[name]['skipped']:
+                        continue
+                    # heavy dependencies are imported on first use, so they can be missing at either step
+                    try:
+                        func, items = BENCHMARKS[name](ctx)
+                        seconds = best_time(func, repeat)
+                    except ImportError as e:
+                        results[name]['skipped'] = 'missing dependency: {}'.format(e)
+                        print('  {:32} skipped ({})'.format(name, results[name]['skipped']))
+                        continue
+                    results[name]['points'].append({'senders': n_senders, 'items': items, 'seconds': seconds,
+                                                    'items_per_s': items / seconds if seconds > 0 else None})
+                    print('  {:32} {:10.4f}s {:12.0f} items/s'.format(name, seconds, items / max(seconds, 1e-9)))
+            finally:
+                os.chdir(cwd)
+    for result in results.values():
+        result['exponent'] = scaling_exponent(result['points'])
+    return results
+
+
+def print_curves(results, scales):
+    print('\n{:32}'.format('Benchmark') + ''.join('{:>12}'.format(s) for s in scales) + '{:>10}'.format('exponent'))
+    for name, result in results.items():
+        if result['skipped']:
+            print('{:32}  skipped'.format(name))
+            continue
+        print('{:32}'.format(name) + ''.join('{:11.4f}s'.format(p['seconds']) for p in result['points'])
+              + '{:>10}'.format(str(result['exponent'])))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the pipeline on synthetic corpora.')
+    parser.add_argument('benchmarks', nargs='*', help='benchmarks to run, all by default: ' + ', '.join(BENCHMARKS))
+    parser.add_argument('--scales', type=int, nargs='+', default=list(SCALES), help='numbers of senders')
+    parser.add_argument('--messages', type=int, default=MESSAGES_PER_SENDER, help='messages per sender')
+    parser.add_argument('--words', type=int, default=80, help='words per message')
+    parser.add_argument('--code-share', type=float, default=0.1, help='share of lines of code')
+    parser.add_argument('--reply-share', type=float, default=0.3, help='share of messages with a quoted reply')
+    parser.add_argument('--html-share', type=float, default=0.1, help='share of HTML messages')
+    parser.add_argument('--repeat', type=int, default=REPEAT, help='runs per benchmark, the best time is kept')
+    parser.add_argument('--output', default=None, help='JSON report, by default in ' + OUTPUT_DIR)
+    args = parser.parse_args()
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        print('Error, unknown benchmark(s): {}'.format(', '.join(unknown)))
+        sys.exit(1)
+
+    warnings.filterwarnings('ignore')
+    names = args.benchmarks or list(BENCHMARKS)
+    results = run_benchmarks(names, args.scales, args.messages, args.repeat, args)
+    print_curves(results, args.scales)
+
+    output = args.output or os.path.join(OUTPUT_DIR, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(file=output, mode='w') as js_f:
+        json.dump({'scales': args.scales, 'messages_per_sender': args.messages, 'repeat': args.repeat,
+                   'benchmarks': results}, js_f, indent=4)
+    print('Report written to {}'.format(output))
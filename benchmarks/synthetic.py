@@ -0,0 +1,141 @@
+"""
+Generator of a synthetic mailing-list corpus, and of the files derived from it by the pipeline, since the real corpus
+in dataset/raw is private. Messages are made of sentences of common English words, and can include lines of code,
+quoted replies and HTML markup, in the given shares.
+"""
+import hashlib
+import json
+import os
+import random
+
+import numpy as np
+import pandas as pd
+
+WORDS = ['the', 'be', 'to', 'of', 'and', 'a', 'in', 'that', 'have', 'i', 'it', 'for', 'not', 'on', 'with', 'he',
+         'as', 'you', 'do', 'at', 'this', 'but', 'his', 'by', 'from', 'they', 'we', 'say', 'her', 'she', 'or', 'an',
+         'will', 'my', 'one', 'all', 'would', 'there', 'their', 'what', 'so', 'up', 'out', 'if', 'about', 'who',
+         'get', 'which', 'go', 'me', 'when', 'make', 'can', 'like', 'time', 'no', 'just', 'him', 'know', 'take',
+         'people', 'into', 'year', 'your', 'good', 'some', 'could', 'them', 'see', 'other', 'than', 'then', 'now',
+         'look', 'only', 'come', 'its', 'over', 'think', 'also', 'back', 'after', 'use', 'two', 'how', 'our', 'work',
+         'first', 'well', 'way', 'even', 'new', 'want', 'because', 'any', 'these', 'give', 'day', 'most', 'us',
+         'patch', 'release', 'build', 'commit', 'issue', 'test', 'vote', 'thanks', 'happy', 'sorry', 'worried',
+         'great', 'problem', 'fix', 'branch', 'review', 'agree', 'maybe', 'never', 'always', 'really', 'family']
+
+CODE_LINES = ['    if (value != null) {', '        return cache.get(key);', '    }',
+              'public static void main(String[] args) throws IOException {', 'import org.apache.commons.io.IOUtils;',
+              '  at org.apache.maven.plugin.DefaultMojo.execute(DefaultMojo.java:42)', 'for (int i = 0; i < n; i++)',
+              '<dependency><groupId>org.apache</groupId></dependency>', 'mvn clean install -DskipTests']
+
+TRAITS = ('extraversion', 'conscientiousness', 'agreeableness', 'openness', 'neuroticism')
+
+
+def sha(text):
+    return hashlib.sha256(text.strip().encode()).hexdigest()
+
+
+def _sentence(rng, n_words):
+    words = [rng.choice(WORDS) for _ in range(n_words)]
+    return ' '.join(words).capitalize() + rng.choice(['.', '.', '.', '!', '?'])
+
+
+def _message(rng, words_per_message, code_share, reply_share, html_share):
+    lines = list()
+    n_words = 0
+    while n_words < words_per_message:
+        if rng.random() < code_share:
+            lines.append(rng.choice(CODE_LINES))
+        else:
+            sentence_length = rng.randint(4, 16)
+            lines.append(_sentence(rng, sentence_length))
+            n_words += sentence_length
+    if rng.random() < reply_share:
+        lines.append('')
+        lines.append('On Mon, Jan 4, 2021 at 10:12 AM Someone <someone@apache.org> wrote:')
+        lines.extend('> ' + _sentence(rng, rng.randint(4, 16)) for _ in range(rng.randint(2, 8)))
+    body = '\n'.join(lines)
+    if rng.random() < html_share:
+        body = '<html><body><p>{}</p></body></html>'.format(body.replace('\n', '<br>\n'))
+    return body
+
+
+def generate_corpus(n_senders, messages_per_sender, words_per_message=80, code_share=0.1, reply_share=0.3,
+                    html_share=0.1, seed=0):
+    """Returns the raw corpus, as in dataset/raw/mailcorpus.json: a list of {email_address, message_body} dicts"""
+    rng = random.Random(seed)
+    corpus = list()
+    for sender in range(n_senders):
+        address = 'developer{}@apache.org'.format(sender)
+        for _ in range(messages_per_sender):
+            corpus.append({'email_address': address,
+                           'message_body': _message(rng, words_per_message, code_share, reply_share, html_share)})
+    return corpus
+
+
+def hashed_corpus(corpus):
+    """Emails of each hashed address, as in dataset/goldstandard/mailcorpus-sha.json (left uncleaned)"""
+    hashed = dict()
+    for d in corpus:
+        hashed.setdefault(sha(d['email_address']), list()).append(d['message_body'])
+    return hashed
+
+
+def gold_standard(hashed_addresses, seed=0):
+    """IPIP scores of each address, as in dataset/goldstandard/ipip-scores-sha.json"""
+    rng = np.random.default_rng(seed)
+    scores = np.round(rng.uniform(1, 5, size=(len(hashed_addresses), len(TRAITS))) * 4) / 4
+    gs = list()
+    for i, hashed_addr in enumerate(hashed_addresses):
+        d = {'id_test': 'T{}'.format(i), 'time': '10:00', 'email': hashed_addr}
+        d.update(zip(TRAITS, scores[i].tolist()))
+        gs.append(d)
+    return gs
+
+
+def recognizer_output(hashed_addresses, seed=0):
+    """Lines of a Personality Recognizer output, with the score table of the given addresses"""
+    rng = np.random.default_rng(seed)
+    scores = rng.uniform(1, 7, size=(len(hashed_addresses), 5))
+    lines = ['', 'Output of Support Vector Machine with Linear Kernel (SMOreg):',
+             '-------------------------------------------------------------', '',
+             'File              \tExtra\tEmoti\tAgree\tConsc\tOpenn']
+    lines.extend('{}.txt \t{}'.format(hashed_addr, '\t'.join('{:.3f}'.format(v) for v in row))
+                 for hashed_addr, row in zip(hashed_addresses, scores))
+    lines.append('')
+    return [line + '\n' for line in lines]
+
+
+def liwc_output(hashed_addresses, categories, seed=0):
+    """LIWC output table of the given addresses, with random percentages in each category"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.uniform(0, 10, size=(len(hashed_addresses), len(categories))), columns=list(categories))
+    df.insert(0, 'Source (A)', ['"{}"'.format(hashed_addr) for hashed_addr in hashed_addresses])
+    return df
+
+
+def tool_scores(hashed_addresses, seed=0):
+    """Rescaled scores of a tool, as in the results.json files"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.uniform(1, 5, size=(len(hashed_addresses), 5)),
+                      columns=['Openn', 'Consc', 'Extra', 'Agree', 'Neuro'])
+    df.insert(0, 'email', list(hashed_addresses))
+    return df
+
+
+def write_dataset(corpus, root='.'):
+    """
+    Writes the raw corpus, the hashed corpus, the address list and the gold standard under root, in the
+    layout of the dataset directory, along with the (empty) directories written by the pipeline.
+    """
+    hashed = hashed_corpus(corpus)
+    for directory in ('dataset/raw', 'dataset/goldstandard', 'dataset/LIWC/data', 'dataset/PersonalityRecognizer/data',
+                      'dataset/twitpersonality/Data', 'results/phase1'):
+        os.makedirs(os.path.join(root, directory), exist_ok=True)
+    with open(file=os.path.join(root, 'dataset/raw/mailcorpus.json'), mode='w') as f:
+        json.dump(corpus, f)
+    with open(file=os.path.join(root, 'dataset/goldstandard/mailcorpus-sha.json'), mode='w') as f:
+        json.dump(hashed, f)
+    with open(file=os.path.join(root, 'dataset/goldstandard/address_list_sha.txt'), mode='w') as f:
+        f.write('\n'.join(hashed))
+    with open(file=os.path.join(root, 'dataset/goldstandard/ipip-scores-sha.json'), mode='w') as f:
+        json.dump(gold_standard(list(hashed)), f)
+    return hashed
@@ -7,5 +7,5 @@ set -Eeuo pipefail
 export PYTHONPATH=./src
 
 echo "Setting up the gold standard files"
-python src/goldstandard_creation.py
+python src/goldstandard_creation.py "$@"
 echo "Done"
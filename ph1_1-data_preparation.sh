@@ -7,5 +7,6 @@ set -Eeuo pipefail
 export PYTHONPATH=./src
 
 echo "Setting up input data for the tools"
-python src/data_preparation.py
+# optional --pack to write the input of TwitPersonality as a single JSON Lines file
+python src/data_preparation.py "$@"
 echo "Done"
@@ -14,9 +14,13 @@ source PersonalityRecognizer.sh -i ../dataset/PersonalityRecognizer/data -d -t 2
 mv output.txt ../dataset/PersonalityRecognizer/results/
 cd ..
 python src/pr.py
+# alternatively, score the developers with a resident Personality Recognizer process,
+# without the per-developer files: `python src/pr.py resident`
 
 echo "LIWC"
 echo "LIWC is a desktop app, execute it manually to create LIWC2007_output.csv stored in dataset/LIWC/data"
+# alternatively, count the LIWC.CAT categories with `python src/liwc_counter.py` and
+# score its output with `python src/liwc.py 2007 dataset/LIWC/data/counter_output.csv`
 # if you used LIWC 2015, pass 2015 as parameter
 python src/liwc.py 2007
 
@@ -7,6 +7,7 @@ set -Eeuo pipefail
 export PYTHONPATH=.:./src
 
 echo "Computing PHASE 1 analyses"
-python src/phase1_analysis.py
+# optional number of worker processes rendering the plots, e.g., bash ph1_3-analyses_execution.sh 4
+python src/phase1_analysis.py "$@"
 
 echo "Done"
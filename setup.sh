@@ -48,16 +48,29 @@ sudo Rscript -e "install.packages('moments', dependencies=TRUE, INSTALL_opts='--
 sudo Rscript -e "install.packages('MuMIn', dependencies=TRUE, INSTALL_opts='--no-lock', repos='${REPO}')"
 sudo Rscript -e "install.packages('renv', dependencies=TRUE, INSTALL_opts='--no-lock', repos='${REPO}')"
 
+echo "Compiling the resident Personality Recognizer"
+JAVAC="${JAVA_HOME:+${JAVA_HOME}/bin/}javac"
+if command -v "${JAVAC}" > /dev/null; then
+  (cd PersonalityRecognizer && "${JAVAC}" -classpath ".:weka-3-4/weka.jar:lib/commons-cli-1.0.jar:lib/jmrc.jar:bin/" \
+    src/recognizer/ResidentRecognizer.java -d bin/)
+else
+  echo "Warning: javac not found, skipping the resident Personality Recognizer, which is optional"
+fi
+
 echo "Setting up the virtual environment"
 python3 -m venv .env
 source .env/bin/activate
 pip install -r requirements.txt
 
+echo "Downloading the NLTK data and training NLoN"
+PYTHONPATH=./src python -c "import utils.email as email; email.ensure_nltk_data(); email.load_nlon()"
+
 echo "Setting up TwitPersonality"
 wget https://dl.fbaipublicfiles.com/fasttext/vectors-english/wiki-news-300d-1M.vec.zip
 unzip wiki-news-300d-1M.vec.zip -d twitpersonality/FastText
 rm wiki-news-300d-1M.vec.zip
 mv twitpersonality/FastText/wiki-news-300d-1M.vec twitpersonality/FastText/dataset.vec
+PYTHONPATH=./src python -c "from utils import fasttext; fasttext.convert_vec()"
 ln -s "$(pwd)/dataset/twitpersonality/myPersonality" "$(pwd)/twitpersonality/training/dataset"
 ln -s "$(pwd)/dataset/twitpersonality/Results" "$(pwd)/twitpersonality/training/Results"
 ln -s "$(pwd)/dataset/twitpersonality/Models" "$(pwd)/twitpersonality/training/Models"
@@ -1,56 +1,124 @@
 """
 This module transforms the corpus into the format require by each benchmarked tool
 """
-
 import json
+import os
+import sys
 
+from utils import io as io_utils
+from utils import profiling
 
-def liwc(senders, data):
-    ds = dict()
-    for hashed_addr in senders:
-        try:
-            emails = '. '.join(data[hashed_addr])
-            ds[hashed_addr] = emails
-        except KeyError:
-            continue
-    with open(file="dataset/LIWC/data/dataset.csv", mode='w') as csv_file:
-        for key in ds:
-            csv_file.write("\"\"\"{}\"\"\",\"\"\"{}\"\"\"\n".format(key, ds[key]))
+# Buffer size of the files written, in bytes
+BUFFER_SIZE = 1 << 20
 
 
-def personality_recognizer(senders, data):
-    for hashed_addr in senders:
-        try:
-            emails = '. '.join(data[hashed_addr])
-            with open("dataset/PersonalityRecognizer/data/{}.txt".format(hashed_addr), 'w') as f:
-                f.write("%s\n" % emails)
-        except KeyError:
-            continue
+class LiwcWriter:
+    """All the developers in a single CSV file"""
 
+    def __init__(self, path="dataset/LIWC/data/dataset.csv"):
+        self.csv_file = open(file=path, mode='w', buffering=BUFFER_SIZE)
 
-def twitpersonality(senders, data):
-    for hashed_addr in senders:
-        try:
-            emails = '. '.join(data[hashed_addr])
-            with open("dataset/twitpersonality/Data/{}.txt".format(hashed_addr), 'w') as f:
-                f.write("%s\n" % emails)
-        except KeyError:
-            continue
+    def write(self, hashed_addr, emails):
+        self.csv_file.write("\"\"\"{}\"\"\",\"\"\"{}\"\"\"\n".format(hashed_addr, emails))
 
+    def close(self, completed=True):
+        self.csv_file.close()
 
-if __name__ == '__main__':
+
+class TextFilesWriter:
+    """One <hashed address>.txt file per developer"""
+
+    def __init__(self, directory, pack_path=None):
+        self.directory = directory
+        # a pack left by a previous run would be read instead of the files
+        if pack_path and os.path.exists(pack_path):
+            os.remove(pack_path)
+
+    def write(self, hashed_addr, emails):
+        with open(os.path.join(self.directory, "{}.txt".format(hashed_addr)), 'w') as f:
+            f.write("%s\n" % emails)
+
+    def close(self, completed=True):
+        pass
+
+
+class PackWriter:
     """
-    The file mailcorpus-sha.json contains the emails written by the developers.
+    All the developers in a single JSON Lines file, one {hashed address: emails} object per line,
+    which is read with io_utils.iter_json_object() in place of the .txt files.
     """
-    with open("dataset/goldstandard/mailcorpus-sha.json", mode="r", encoding="utf-8") as f:
-        email_corpus = json.load(f)
 
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        self.f = open(file=self.tmp_path, mode='w', encoding='utf-8', buffering=BUFFER_SIZE)
+
+    def write(self, hashed_addr, emails):
+        self.f.write(json.dumps({hashed_addr: "%s\n" % emails}))
+        self.f.write('\n')
+
+    def close(self, completed=True):
+        self.f.close()
+        if completed:
+            os.replace(self.tmp_path, self.path)
+        else:
+            os.remove(self.tmp_path)
+
+
+def liwc(pack=False):
+    return LiwcWriter()
+
+
+def personality_recognizer(pack=False):
+    # the Personality Recognizer only reads directories of .txt files
+    return TextFilesWriter("dataset/PersonalityRecognizer/data")
+
+
+def twitpersonality(pack=False):
+    pack_path = "dataset/twitpersonality/Data.jsonl"
+    return PackWriter(pack_path) if pack else TextFilesWriter("dataset/twitpersonality/Data", pack_path)
+
+
+# Writer of the input files of each tool
+TOOLS = {'LIWC': liwc, 'PR': personality_recognizer, 'TP': twitpersonality}
+
+
+def run(senders, corpus=None, tools=tuple(TOOLS), pack=False):
     """
-    Here we retrieve the list of developers to perform the emails merging. 
+    Writes the input files of the given tools in a single pass over the corpus: the emails of each developer
+    are joined once and written in the format of every tool. The corpus is either a mapping of the emails of each
+    developer already loaded, or it is read from the columnar store of the corpus. With pack=True, the tools that
+    can read it get a single JSON Lines file rather than one file per developer.
+    """
+    if corpus is None:
+        corpus = io_utils.load_mail_corpus()
+    writers = [TOOLS[tool](pack) for tool in tools]
+    completed = False
+    try:
+        with profiling.stage('prepare/export') as record:
+            for hashed_addr, messages in corpus.items():
+                if hashed_addr in senders:
+                    emails = '. '.join(messages)
+                    for writer in writers:
+                        writer.write(hashed_addr, emails)
+                    record.items += 1
+        completed = True
+    finally:
+        for writer in writers:
+            writer.close(completed)
+
+
+if __name__ == '__main__':
+    """
+    Here we retrieve the list of developers to perform the emails merging.
     """
     with open(file="dataset/goldstandard/address_list_sha.txt", mode="r") as f:
-        hashed_senders = [line.strip() for line in f.readlines()]
+        hashed_senders = {line.strip() for line in f.readlines()}
 
-    liwc(hashed_senders, email_corpus)
-    personality_recognizer(hashed_senders, email_corpus)
-    twitpersonality(hashed_senders, email_corpus)
+    """
+    The file mailcorpus-sha.json contains the emails written by the developers, which are
+    read one developer at a time from its columnar store. With the optional --pack argument, the input of
+    TwitPersonality is written as a single JSON Lines file.
+    """
+    run(hashed_senders, pack='--pack' in sys.argv[1:])
+    profiling.write_report('data_preparation')
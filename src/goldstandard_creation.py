@@ -1,13 +1,37 @@
 """
 This module creates the gold standard for the benchmarking. It takes care of anonymizing the content and the senders
 """
+import argparse
 import json
 
+from utils import io as io_utils
+from utils import profiling
 from utils.email import email_utils
+from utils.email.dedup import THRESHOLD, Deduplicator
+
+# Report of the near-duplicate messages dropped
+DEDUP_REPORT_PATH = 'dataset/raw/mailcorpus-dedup.json'
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Creates the anonymized gold standard.')
+    parser.add_argument('workers', type=int, nargs='?', default=1, help='number of worker processes')
+    parser.add_argument('chunk_size', type=int, nargs='?', default=email_utils.CHUNK_SIZE,
+                        help='number of emails per chunk')
+    parser.add_argument('--dedup', type=float, nargs='?', const=THRESHOLD, default=None, metavar='THRESHOLD',
+                        help='drop the near-duplicate messages of a sender before the cleaning, with the given '
+                             'Jaccard similarity threshold ({} by default)'.format(THRESHOLD))
+    parser.add_argument('--dedup-across-senders', action='store_true',
+                        help='with --dedup, also drop the near-duplicates of the messages of other senders')
+    args = parser.parse_args()
+    if args.dedup is not None and not 0 < args.dedup <= 1:
+        parser.error('the --dedup threshold must be in (0, 1], got {}'.format(args.dedup))
+    dedup = Deduplicator(args.dedup, across_senders=args.dedup_across_senders) if args.dedup is not None else None
+
     email_list, hashed_email_list = email_utils.hash_score_email_addresses()
-    corpus_dict = email_utils.get_mail_corpus()
+    corpus_dict = email_utils.get_mail_corpus(chunk_size=args.chunk_size, workers=args.workers, dedup=dedup)
+    if dedup is not None:
+        dedup.write_report(DEDUP_REPORT_PATH)
+        print('Near-duplicates report written to {}'.format(DEDUP_REPORT_PATH))
 
     hashed_corpus_dict = dict()
     i = 1
@@ -17,5 +41,8 @@ if __name__ == '__main__':
             hashed_corpus_dict[hashed_email] = list(corpus_dict[email])
         i += 1
 
-    with open(file="dataset/goldstandard/mailcorpus-sha.json", mode="w") as f:
+    with open(file=io_utils.MAILCORPUS_PATH, mode="w") as f:
         f.write(json.dumps(hashed_corpus_dict, indent=4))
+    # columnar store read by the other scripts, see utils.io.mailcorpus
+    io_utils.store_mail_corpus(hashed_corpus_dict.items())
+    profiling.write_report('goldstandard_creation')
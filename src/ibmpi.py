@@ -2,13 +2,16 @@ import pandas as pd
 
 import utils.io as io_utils
 import utils.math as math_utils
+from utils import profiling
 
-if __name__ == '__main__':
-    gold_std_df = io_utils.load_gold_standard()
+
+def run(gold_std):
     res_df = pd.read_json("dataset/PersonalityInsights/data/dataset.json")
-    rescaled_res_df = math_utils.rescale(res_df, old_min=0, old_max=1, new_min=1, new_max=5)
-    MAE = math_utils.compute_mae(rescaled_res_df, gold_std_df)
-    RMSE = math_utils.compute_rmse(rescaled_res_df, gold_std_df)
-    io_utils.store_results('dataset/PersonalityInsights/results/mae.json', MAE,
-                           'dataset/PersonalityInsights/results/rmse.json', RMSE,
-                           'dataset/PersonalityInsights/results/results.json', rescaled_res_df)
+    rescaled_res_df = math_utils.rescale(res_df, old_min=0, old_max=1, new_min=1, new_max=5, inplace=True)
+    math_utils.store_evaluation(rescaled_res_df, gold_std, 'dataset/PersonalityInsights/results')
+    return rescaled_res_df
+
+
+if __name__ == '__main__':
+    run(io_utils.load_gold_standard_store())
+    profiling.write_report('ibmpi')
@@ -6,93 +6,82 @@ Journal of research in personality, vol. 44, no. 3, pp.363-373, 2010 (suppl. mat
 
 import sys
 
+import numpy as np
 import pandas as pd
 
 import utils.io as io_utils
 import utils.math as math_utils
-
-
-def _get_openness(score, liwc_ver):
-    value = (
-            - 0.21 * score['pronoun'] - 0.16 * score['i'] - 0.1 * score['we'] - 0.12 * score['you'] - 0.13 *
-            score['negate'] - 0.11 * score['assent'] + 0.2 * score['article'] - 0.12 * score['affect'] - 0.15 *
-            score['posemo'] - 0.12 * score['discrep'] - 0.08 * score['hear'] - 0.14 * score['social'] - 0.17 *
-            score['family'] - 0.22 * score['time'] - 0.11 * score['space'] - 0.22 * score['motion'] -
-            0.17 * score['leisure'] - 0.2 * score['home'] + 0.15 * score['death'] - 0.15 * score['ingest'])
-
-    if liwc_ver == '2007':
-        value = value + 0.17 * score['preps'] - 0.09 * score['cogmech'] - 0.16 * score['past'] - 0.16 * score[
-            'present'] - 0.09 * score['humans'] - 0.11 * score['incl']
-    elif liwc_ver == '2015':
-        value = value + 0.17 * score['prep'] - 0.09 * score['cogproc'] - 0.16 * score['focuspast'] - 0.16 * score[
-            'focuspresent']
-    return value
-
-
-def _get_conscientiousness(score, liwc_ver):
-    value = (- 0.17 * score['negate'] - 0.18 * score['negemo'] - 0.19 * score['anger'] - 0.11 * score['sad'] - 0.12 *
-             score['cause'] - 0.13 * score['discrep'] - 0.1 * score['tentat'] - 0.1 * score['certain'] - 0.12 *
-             score['hear'] + 0.09 * score['time'] + 0.14 * score['achieve'] - 0.12 * score['death'] -
-             0.14 * score['swear'])
-
-    if liwc_ver == '2007':
-        value = value - 0.11 * score['cogmech'] - 0.12 * score['humans'] - 0.16 * score['excl']
-    elif liwc_ver == '2015':
-        value = value - 0.11 * score['cogproc']
-    return value
-
-
-def _get_extraversion(score, liwc_ver):
-    value = (0.11 * score['we'] + 0.16 * score['you'] - 0.12 * score['number'] + 0.1 * score['posemo'] -
-             0.09 * score['cause'] - 0.11 * score['tentat'] + 0.1 * score['certain'] + 0.12 * score['hear'] + 0.15 *
-             score['social'] + 0.15 * score['friend'] + 0.09 * score['family'] - 0.08 * score['work'] - 0.09 *
-             score['achieve'] + 0.08 * score['leisure'] + 0.11 * score['relig'] + 0.1 * score['body'] + 0.17 *
-             score['sexual'])
-    if liwc_ver == '2007':
-        value = value + 0.13 * score['humans'] + 0.09 * score['incl']
-    return value
-
-
-def _get_agreeableness(score, liwc_ver):
-    value = (0.11 * score['pronoun'] + 0.18 * score['we'] + 0.11 * score['number'] + 0.18 *
-             score['posemo'] - 0.15 * score['negemo'] - 0.23 * score['anger'] - 0.11 * score['cause'] + 0.09 *
-             score['see'] + 0.1 * score['feel'] + 0.13 * score['social'] + 0.11 * score['friend'] + 0.19 *
-             score['family'] + 0.12 * score['time'] + 0.16 * score['space'] + 0.14 * score['motion'] + 0.15 *
-             score['leisure'] + 0.19 * score['home'] - 0.11 * score['money'] - 0.13 * score['death'] + 0.09 *
-             score['body'] + 0.08 * score['sexual'] - 0.21 * score['swear'])
-    if liwc_ver == '2007':
-        value = value + 0.1 * score['past'] + 0.18 * score['incl']
-    elif liwc_ver == '2015':
-        value = value + 0.1 * score['focuspast']
-    return value
-
-
-def _get_neuroticism(score, liwc_ver):
-    value = (
-            0.12 * score['i'] - 0.15 * score['you'] + 0.11 * score['negate'] - 0.11 * score['article'] + 0.16 *
-            score['negemo'] + 0.17 * score['anx'] + 0.13 * score['anger'] + 0.1 * score['sad'] + 0.11 *
-            score['cause'] + 0.13 * score['discrep'] + 0.12 * score['tentat'] + 0.13 * score['certain'] + 0.1 *
-            score['feel'] - 0.08 * score['friend'] - 0.09 * score['space'] + 0.11 + score['swear'])
-    if liwc_ver == '2007':
-        value = value + 0.13 * score['cogmech'] + 0.1 * score['excl']
-    elif liwc_ver == '2015':
-        value = value + 0.13 * score['cogproc']
-    return value
+from utils import profiling
+
+
+TRAITS = ('Openn', 'Consc', 'Extra', 'Agree', 'Neuro')
+
+# Yarkoni's correlations between LIWC categories and traits, shared by all the dictionary versions
+_WEIGHTS = {
+    'Openn': {'pronoun': -0.21, 'i': -0.16, 'we': -0.1, 'you': -0.12, 'negate': -0.13, 'assent': -0.11,
+              'article': 0.2, 'affect': -0.12, 'posemo': -0.15, 'discrep': -0.12, 'hear': -0.08, 'social': -0.14,
+              'family': -0.17, 'time': -0.22, 'space': -0.11, 'motion': -0.22, 'leisure': -0.17, 'home': -0.2,
+              'death': 0.15, 'ingest': -0.15},
+    'Consc': {'negate': -0.17, 'negemo': -0.18, 'anger': -0.19, 'sad': -0.11, 'cause': -0.12, 'discrep': -0.13,
+              'tentat': -0.1, 'certain': -0.1, 'hear': -0.12, 'time': 0.09, 'achieve': 0.14, 'death': -0.12,
+              'swear': -0.14},
+    'Extra': {'we': 0.11, 'you': 0.16, 'number': -0.12, 'posemo': 0.1, 'cause': -0.09, 'tentat': -0.11,
+              'certain': 0.1, 'hear': 0.12, 'social': 0.15, 'friend': 0.15, 'family': 0.09, 'work': -0.08,
+              'achieve': -0.09, 'leisure': 0.08, 'relig': 0.11, 'body': 0.1, 'sexual': 0.17},
+    'Agree': {'pronoun': 0.11, 'we': 0.18, 'number': 0.11, 'posemo': 0.18, 'negemo': -0.15, 'anger': -0.23,
+              'cause': -0.11, 'see': 0.09, 'feel': 0.1, 'social': 0.13, 'friend': 0.11, 'family': 0.19, 'time': 0.12,
+              'space': 0.16, 'motion': 0.14, 'leisure': 0.15, 'home': 0.19, 'money': -0.11, 'death': -0.13,
+              'body': 0.09, 'sexual': 0.08, 'swear': -0.21},
+    # swear words enter with weight 1 plus a 0.11 constant (see _INTERCEPTS), as in the scores computed so far
+    'Neuro': {'i': 0.12, 'you': -0.15, 'negate': 0.11, 'article': -0.11, 'negemo': 0.16, 'anx': 0.17, 'anger': 0.13,
+              'sad': 0.1, 'cause': 0.11, 'discrep': 0.13, 'tentat': 0.12, 'certain': 0.13, 'feel': 0.1,
+              'friend': -0.08, 'space': -0.09, 'swear': 1.0},
+}
+
+# Correlations for the categories that differ between dictionary versions
+_VERSION_WEIGHTS = {
+    '2007': {
+        'Openn': {'preps': 0.17, 'cogmech': -0.09, 'past': -0.16, 'present': -0.16, 'humans': -0.09, 'incl': -0.11},
+        'Consc': {'cogmech': -0.11, 'humans': -0.12, 'excl': -0.16},
+        'Extra': {'humans': 0.13, 'incl': 0.09},
+        'Agree': {'past': 0.1, 'incl': 0.18},
+        'Neuro': {'cogmech': 0.13, 'excl': 0.1},
+    },
+    '2015': {
+        'Openn': {'prep': 0.17, 'cogproc': -0.09, 'focuspast': -0.16, 'focuspresent': -0.16},
+        'Consc': {'cogproc': -0.11},
+        'Agree': {'focuspast': 0.1},
+        'Neuro': {'cogproc': 0.13},
+    },
+}
+
+_INTERCEPTS = {'Openn': 0.0, 'Consc': 0.0, 'Extra': 0.0, 'Agree': 0.0, 'Neuro': 0.11}
+
+
+def big5_weights(liwc_ver):
+    """
+    Returns the category x trait weight matrix for the given dictionary version as a DataFrame,
+    with a zero weight for the categories unrelated to a trait.
+    """
+    weights = dict()
+    for trait in TRAITS:
+        weights[trait] = dict(_WEIGHTS[trait])
+        weights[trait].update(_VERSION_WEIGHTS.get(liwc_ver, {}).get(trait, {}))
+    return pd.DataFrame(weights, columns=TRAITS).fillna(0.0)
 
 
 def compute_big5_scores(emails, raw_results, dict_ver):
-    scores_list = list()
-    for email in emails:
-        row = raw_results.loc[raw_results['Source (A)'] == email].copy(deep=True)
-        row = row.drop(columns=['Source (A)']).iloc[0]  # there's just one row
-        ope = _get_openness(row, dict_ver)
-        con = _get_conscientiousness(row, dict_ver)
-        ext = _get_extraversion(row, dict_ver)
-        agr = _get_agreeableness(row, dict_ver)
-        neu = _get_neuroticism(row, dict_ver)
-        row_dict = {'email': email.strip('"'), 'Openn': ope, 'Consc': con, 'Extra': ext, 'Agree': agr, 'Neuro': neu}
-        scores_list.append(row_dict)
-    scores = pd.DataFrame(data=scores_list, columns=('email', 'Openn', 'Consc', 'Extra', 'Agree', 'Neuro'))
+    """
+    The scores of all the emails are computed at once, by multiplying the LIWC output table
+    by the weight matrix of the dictionary version.
+    """
+    emails = list(emails)
+    weights = big5_weights(dict_ver)
+    rows = raw_results.drop_duplicates(subset='Source (A)').set_index('Source (A)').loc[emails]
+    values = rows[weights.index].to_numpy(dtype=float) @ weights.to_numpy()
+    values += np.array([_INTERCEPTS[trait] for trait in TRAITS])
+    scores = pd.DataFrame(data=values, columns=TRAITS)
+    scores.insert(0, 'email', [email.strip('"') for email in emails])
     return scores
 
 
@@ -102,27 +91,26 @@ def min_max(scores):
     return round(_min.min()), round(_max.max())
 
 
-if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print('Error, missing argument: pass "2007" or "2015"')
-        exit(1)
-    liwc_dictionary = str(sys.argv[1])
-    path = 'dataset/LIWC/data/LIWC{}_output.csv'.format(liwc_dictionary)
+def run(gold_std, liwc_dictionary, path=None):
+    """Scores the developers from the LIWC output in path, by default the one of the LIWC desktop app"""
+    if path is None:
+        path = 'dataset/LIWC/data/LIWC{}_output.csv'.format(liwc_dictionary)
     liwc_results_raw = io_utils.load_csv_into_df(path=path, sep=',', decimal=',')
     liwc_results_raw.drop(columns=['Source (B)'], inplace=True)  # drop email bodies
     hashed_emails = liwc_results_raw['Source (A)']  # these emails are wrapped in ""
-    gold_std_df = io_utils.load_gold_standard()
 
-    scores_df = compute_big5_scores(hashed_emails, liwc_results_raw, liwc_dictionary)
-    """
-        Gold standard contains more developers than the dataset
-        So, we remove all the useless entries
-    """
-    gold_std_df = gold_std_df.loc[gold_std_df['email'].isin(scores_df['email'])]
+    with profiling.stage('liwc/big5_scores', items=len(hashed_emails)):
+        scores_df = compute_big5_scores(hashed_emails, liwc_results_raw, liwc_dictionary)
     _min, _max = min_max(scores_df)
-    rescaled_res_df = math_utils.rescale(scores_df, old_min=_min, old_max=_max, new_min=1, new_max=5)
-    MAE = math_utils.compute_mae(rescaled_res_df, gold_std_df)
-    RMSE = math_utils.compute_rmse(rescaled_res_df, gold_std_df)
-    io_utils.store_results('dataset/LIWC/results/mae.json', MAE,
-                           'dataset/LIWC/results/rmse.json', RMSE,
-                           'dataset/LIWC/results/results.json', rescaled_res_df)
+    rescaled_res_df = math_utils.rescale(scores_df, old_min=_min, old_max=_max, new_min=1, new_max=5, inplace=True)
+    math_utils.store_evaluation(rescaled_res_df, gold_std, 'dataset/LIWC/results')
+    return rescaled_res_df
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('Error, missing argument: pass "2007" or "2015"')
+        exit(1)
+    # optional argument: LIWC output file, e.g., the one created by liwc_counter.py
+    run(io_utils.load_gold_standard_store(), str(sys.argv[1]), sys.argv[2] if len(sys.argv) > 2 else None)
+    profiling.write_report('liwc')
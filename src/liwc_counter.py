@@ -0,0 +1,231 @@
+"""
+This module replaces the manual run of the LIWC desktop app. It counts the words of each document in
+dataset/LIWC/data/dataset.csv falling in each category of a LIWC-style dictionary, and writes the percentages
+in the same layout as the LIWC output consumed by liwc.py.
+
+Both the hierarchical .CAT format (e.g., PersonalityRecognizer/lib/LIWC.CAT) and the .dic format are supported.
+The categories of the .CAT dictionary are renamed after their LIWC 2007 counterparts, so the output can be scored
+with the 2007 weights, i.e., `python src/liwc.py 2007 <output file>`.
+"""
+import csv
+import re
+import sys
+from itertools import islice
+
+import numpy as np
+from scipy import sparse
+
+from utils import profiling
+
+DICTIONARY_PATH = 'PersonalityRecognizer/lib/LIWC.CAT'
+INPUT_PATH = 'dataset/LIWC/data/dataset.csv'
+OUTPUT_PATH = 'dataset/LIWC/data/counter_output.csv'
+# Number of documents counted at a time
+BATCH_SIZE = 1000
+
+# Columns of the LIWC 2007 output, in order
+LIWC2007_COLUMNS = ['funct', 'pronoun', 'ppron', 'i', 'we', 'you', 'shehe', 'they', 'ipron', 'article', 'verb',
+                    'auxverb', 'past', 'present', 'future', 'adverb', 'preps', 'conj', 'negate', 'quant', 'number',
+                    'swear', 'social', 'family', 'friend', 'humans', 'affect', 'posemo', 'negemo', 'anx', 'anger',
+                    'sad', 'cogmech', 'insight', 'cause', 'discrep', 'tentat', 'certain', 'inhib', 'incl', 'excl',
+                    'percept', 'see', 'hear', 'feel', 'bio', 'body', 'health', 'sexual', 'ingest', 'relativ',
+                    'motion', 'space', 'time', 'work', 'achieve', 'leisure', 'home', 'money', 'relig', 'death',
+                    'assent', 'nonfl', 'filler']
+
+# Categories of LIWC.CAT and their LIWC 2007 names, the others are not written
+CAT_CATEGORIES = {
+    'PRONOUN': 'pronoun', 'I': 'i', 'WE': 'we', 'YOU': 'you', 'NEGATIONS': 'negate', 'ASSENTS': 'assent',
+    'ARTICLES': 'article', 'PREPOSITIONS': 'preps', 'NUMBERS': 'number', 'AFFECTIVE PROCESS': 'affect',
+    'POSITIVE EMOTION': 'posemo', 'NEGATIVE EMOTION': 'negemo', 'ANXIETY': 'anx', 'ANGER': 'anger',
+    'SADNESS': 'sad', 'COGNITIVE PROCESS': 'cogmech', 'CAUSATION': 'cause', 'INSIGHT': 'insight',
+    'DISCREPANCY': 'discrep', 'INHIBITION': 'inhib', 'TENTATIVE': 'tentat', 'CERTAINTY': 'certain',
+    'SENSORY PROCESS': 'percept', 'SEEING': 'see', 'HEARING': 'hear', 'FEELING': 'feel', 'SOCIAL PROCESS': 'social',
+    'FRIENDS': 'friend', 'FAMILY': 'family', 'HUMANS': 'humans', 'TIME': 'time', 'PAST': 'past',
+    'PRESENT': 'present', 'FUTURE': 'future', 'SPACE': 'space', 'INCLUSIVE': 'incl', 'EXCLUSIVE': 'excl',
+    'MOTION': 'motion', 'JOB OR WORK': 'work', 'ACHIEVEMENT': 'achieve', 'LEISURE ACTIVITY': 'leisure',
+    'HOME': 'home', 'MONEY': 'money', 'RELIGION': 'relig', 'DEATH AND DYING': 'death', 'BODY STATES': 'body',
+    'SEXUALITY': 'sexual', 'EATING': 'ingest', 'SWEAR WORDS': 'swear', 'NONFLUENCIES': 'nonfl',
+    'FILLERS': 'filler'}
+
+_WORD = re.compile(r"[a-z0-9']+")
+_SENTENCE_END = re.compile(r'[.!?]+')
+# Trie node keys marking the categories of an exact word and of a stem (wildcard) entry
+_EXACT = 0
+_STEM = 1
+
+
+def load_dictionary(path):
+    """
+    Returns the list of category names and a dict mapping each dictionary entry (lowercase,
+    with the trailing '*' of stems) to the set of indices of its categories.
+    """
+    if path.lower().endswith('.cat'):
+        return _load_cat(path)
+    return _load_dic(path)
+
+
+def _load_cat(path):
+    categories = list()
+    entries = dict()
+    category = None
+    with open(file=path, mode='r', encoding='latin-1') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            depth = len(line) - len(line.lstrip('\t'))
+            text = line.strip()
+            if depth == 1:
+                category = CAT_CATEGORIES.get(text)
+                if category is not None and category not in categories:
+                    categories.append(category)
+            elif depth == 2 and category is not None:
+                word = text.split(' (')[0].lower()
+                entries.setdefault(word, set()).add(categories.index(category))
+    return categories, entries
+
+
+def _load_dic(path):
+    categories = list()
+    entries = dict()
+    ids = dict()
+    with open(file=path, mode='r', encoding='utf-8') as f:
+        lines = [line.strip() for line in f if line.strip()]
+    # the categories are listed between the first two lines starting with %
+    delimiters = [i for i, line in enumerate(lines) if line.startswith('%')][:2]
+    for line in lines[delimiters[0] + 1:delimiters[1]]:
+        cat_id, name = line.split()[:2]
+        ids[cat_id] = len(categories)
+        categories.append(name)
+    for line in lines[delimiters[1] + 1:]:
+        fields = line.split('\t') if '\t' in line else line.split()
+        word = fields[0].lower()
+        entries.setdefault(word, set()).update(ids[cat_id] for cat_id in fields[1:] if cat_id in ids)
+    return categories, entries
+
+
+def compile_trie(entries):
+    """Compiles the dictionary entries into a character trie, in which stems are marked as such"""
+    trie = dict()
+    for word, categories in entries.items():
+        node = trie
+        stem = word.endswith('*')
+        for char in word.rstrip('*'):
+            node = node.setdefault(char, dict())
+        node.setdefault(_STEM if stem else _EXACT, set()).update(categories)
+    return trie
+
+
+def match(trie, word):
+    """
+    Returns the categories of a word: those of the exact entry if any, otherwise
+    those of the longest stem the word starts with (None if the word is not in the dictionary).
+    """
+    node = trie
+    longest_stem = node.get(_STEM)
+    for char in word:
+        node = node.get(char)
+        if node is None:
+            return longest_stem
+        longest_stem = node.get(_STEM, longest_stem)
+    return node.get(_EXACT, longest_stem)
+
+
+class CategoryCounter:
+    """
+    Counts the dictionary categories of documents in bulk: documents are turned into a sparse
+    document x word matrix, which is multiplied by the word x category matrix. Each distinct word
+    is matched against the trie only once, the first time it is seen.
+    """
+
+    def __init__(self, categories, entries):
+        self.categories = categories
+        self._trie = compile_trie(entries)
+        self._vocabulary = dict()
+        # for each word of the vocabulary: the indices of its categories, whether in dictionary and longer than 6
+        self._cat_rows = list()
+        self._cat_cols = list()
+        self._in_dic = list()
+        self._long = list()
+
+    def _word_id(self, word):
+        word_id = self._vocabulary.get(word)
+        if word_id is None:
+            word_id = len(self._vocabulary)
+            self._vocabulary[word] = word_id
+            categories = match(self._trie, word) or ()
+            for category in categories:
+                self._cat_rows.append(word_id)
+                self._cat_cols.append(category)
+            self._in_dic.append(bool(categories))
+            self._long.append(len(word) > 6)
+        return word_id
+
+    def count(self, documents):
+        """
+        Returns a (documents x columns) array with the word count, words per sentence, percentage
+        of words longer than six letters, percentage of dictionary words and then the percentage of
+        words in each category.
+        """
+        doc_ids = list()
+        word_ids = list()
+        sentences = np.zeros(len(documents))
+        for i, document in enumerate(documents):
+            document = document.lower()
+            words = _WORD.findall(document)
+            word_ids.extend(self._word_id(word) for word in words)
+            doc_ids.extend([i] * len(words))
+            sentences[i] = max(len([s for s in _SENTENCE_END.split(document) if _WORD.search(s)]), 1)
+
+        n_words = len(self._vocabulary)
+        doc_word = sparse.csr_matrix((np.ones(len(word_ids)), (doc_ids, word_ids)),
+                                     shape=(len(documents), n_words))
+        word_cat = sparse.csr_matrix((np.ones(len(self._cat_rows)), (self._cat_rows, self._cat_cols)),
+                                     shape=(n_words, len(self.categories)))
+        word_count = np.asarray(doc_word.sum(axis=1)).ravel()
+        features = np.column_stack([doc_word @ np.array(self._long, dtype=float),
+                                    doc_word @ np.array(self._in_dic, dtype=float),
+                                    (doc_word @ word_cat).toarray()])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percentages = np.nan_to_num(100 * features / word_count[:, None])
+        return np.column_stack([word_count, word_count / sentences, percentages])
+
+
+def _format(value):
+    return '{:.2f}'.format(value).replace('.', ',')
+
+
+def count_dataset(dictionary_path=DICTIONARY_PATH, input_path=INPUT_PATH, output_path=OUTPUT_PATH,
+                  batch_size=BATCH_SIZE):
+    categories, entries = load_dictionary(dictionary_path)
+    # keep the order of the LIWC 2007 output, any other category goes last
+    order = sorted(range(len(categories)), key=lambda c: (LIWC2007_COLUMNS.index(categories[c])
+                                                          if categories[c] in LIWC2007_COLUMNS
+                                                          else len(LIWC2007_COLUMNS), c))
+    counter = CategoryCounter(categories, entries)
+    header = ['Source (A)', 'Source (B)', 'WC', 'WPS', 'Sixltr', 'Dic'] + [categories[c] for c in order]
+    columns = [0, 1, 2, 3] + [4 + c for c in order]
+
+    with open(file=input_path, mode='r', newline='') as in_f, open(file=output_path, mode='w', newline='') as out_f:
+        reader = csv.reader(in_f)
+        writer = csv.writer(out_f)
+        writer.writerow(header)
+        n = 0
+        while True:
+            rows = list(islice(reader, batch_size))
+            if not rows:
+                break
+            batch = [row for row in rows if len(row) >= 2]
+            with profiling.stage('liwc_counter/count', items=len(batch)):
+                counts = counter.count([row[1] for row in batch])
+            for row, doc_counts in zip(batch, counts[:, columns]):
+                writer.writerow([row[0], row[1], str(int(doc_counts[0]))] + [_format(v) for v in doc_counts[1:]])
+            n += len(batch)
+            print('{} documents counted'.format(n))
+
+
+if __name__ == '__main__':
+    # optional arguments: dictionary file and output file
+    dictionary = sys.argv[1] if len(sys.argv) > 1 else DICTIONARY_PATH
+    output = sys.argv[2] if len(sys.argv) > 2 else OUTPUT_PATH
+    count_dataset(dictionary_path=dictionary, output_path=output)
+    profiling.write_report('liwc_counter')
@@ -1,102 +1,101 @@
 import json
+import sys
 
 import numpy as np
 import pandas as pd
 
 from utils import io as io_utils
 from utils import plot as plot_utils
-from utils.math import test_normal_distribution as normal, qq_plot
-
-
-def build_dataframe(tool_resfile_dict, gs_df):
-    gs_df.drop(columns=['email'], inplace=True)
-    df_o = pd.DataFrame(columns=['GOLDSTD'] + list(tool_resfile_dict.keys()))
-    df_c = pd.DataFrame(columns=['GOLDSTD'] + list(tool_resfile_dict.keys()))
-    df_e = pd.DataFrame(columns=['GOLDSTD'] + list(tool_resfile_dict.keys()))
-    df_a = pd.DataFrame(columns=['GOLDSTD'] + list(tool_resfile_dict.keys()))
-    df_n = pd.DataFrame(columns=['GOLDSTD'] + list(tool_resfile_dict.keys()))
-    for tool in tool_resfile_dict:
-        with open(file=tool_resfile_dict[tool], mode='r') as jsf:
-            js = json.load(jsf)
-            temp = pd.DataFrame.from_dict(js)
-            df_o[tool] = temp['Openn']
-            df_c[tool] = temp['Consc']
-            df_e[tool] = temp['Extra']
-            df_a[tool] = temp['Agree']
-            df_n[tool] = temp['Neuro']
-
-    df_o['GOLDSTD'] = gs_df['openness'].values
-    df_c['GOLDSTD'] = gs_df['conscientiousness'].values
-    df_e['GOLDSTD'] = gs_df['extraversion'].values
-    df_a['GOLDSTD'] = gs_df['agreeableness'].values
-    df_n['GOLDSTD'] = gs_df['neuroticism'].values
-    return df_o, df_c, df_e, df_a, df_n, df_o.columns
-
-
-def normality_test(df_o, df_c, df_e, df_a, df_n, tools):
+from utils import profiling
+from utils.math import rank_scores, correlation_matrices, test_normal_distributions
+
+
+# Traits: key in the tool results, name in the reports, column in the gold standard
+TRAITS = [('Openn', 'Openness', 'openness'),
+          ('Consc', 'Conscientiousness', 'conscientiousness'),
+          ('Extra', 'Extraversion', 'extraversion'),
+          ('Agree', 'Agreeableness', 'agreeableness'),
+          ('Neuro', 'Neuroticism', 'neuroticism')]
+# Headings of the trait correlation matrices, as in the reports produced so far
+CORRELATION_HEADINGS = ['Openness', 'Conscientiousness', 'Extraversion', 'Agreeableness', 'Neuro']
+
+# Data hashes of the rendered plots
+PLOT_MANIFEST = 'results/phase1/plots.json'
+
+TOOLS = {'LIWC': 'dataset/LIWC/results/results.json',
+         'PI': 'dataset/PersonalityInsights/results/results.json',
+         'PR': 'dataset/PersonalityRecognizer/results/results.json',
+         'TP': 'dataset/twitpersonality/Results/results.json'}
+
+
+def load_tool_results(path):
+    """Loads a results.json file, with the integer row index of the stored DataFrame"""
+    with open(file=path, mode='r') as jsf:
+        js = json.load(jsf)
+        temp = pd.DataFrame.from_dict(js)
+    temp.index = temp.index.astype(int)
+    return temp
+
+
+def build_scores(tool_results, gs_df):
+    """
+    Returns the (trait x tool x subject) array of the scores, in which the gold standard is the first tool,
+    and the list of the tool names. The scores of each tool are aligned on the row index of the first tool,
+    while the gold standard is aligned by position.
+    """
+    tools = ['GOLDSTD'] + list(tool_results.keys())
+    index = next(iter(tool_results.values())).index if tool_results else pd.RangeIndex(len(gs_df))
+    scores = np.empty((len(TRAITS), len(tools), len(index)))
+    for t, (key, _, gold_column) in enumerate(TRAITS):
+        scores[t, 0] = gs_df[gold_column].values
+        for i, temp in enumerate(tool_results.values(), start=1):
+            scores[t, i] = temp[key].reindex(index).to_numpy(dtype=float)
+    return scores, tools
+
+
+def normality_test(scores, tools):
+    is_normal, stat, p = test_normal_distributions(scores)
     with open(file="results/phase1/shapiro.txt", mode="w") as f:
-        for tool in tools:
+        for i, tool in enumerate(tools):
             f.write("{}\n".format(tool))
-            is_normal, stat, p = normal(df_o[tool])
-            f.write("Openness normally distributed? {} (W={:.3f}, p={:.3f})\n".format(is_normal, stat, p))
-            is_normal, stat, p = normal(df_c[tool])
-            f.write("Conscientiousness normally distributed? {} (W={:.3f}, p={:.3f})\n".format(is_normal, stat, p))
-            is_normal, stat, p = normal(df_e[tool])
-            f.write("Extraversion normally distributed? {} (W={:.3f}, p={:.3f})\n".format(is_normal, stat, p))
-            is_normal, stat, p = normal(df_a[tool])
-            f.write("Agreeableness normally distributed? {} (W={:.3f}, p={:.3f})\n".format(is_normal, stat, p))
-            is_normal, stat, p = normal(df_n[tool])
-            f.write("Neuroticism normally distributed? {} (W={:.3f}, p={:.3f})\n\n".format(is_normal, stat, p))
-            # QQ plot
-            qq_plot(tool, df_o[tool], df_c[tool], df_e[tool], df_a[tool], df_n[tool])
-
-
-def pairwise_correlations(df_o, df_c, df_e, df_a, df_n, method):
+            for t, (_, name, _) in enumerate(TRAITS):
+                f.write("{} normally distributed? {} (W={:.3f}, p={:.3f})\n".format(name, is_normal[t, i],
+                                                                                   stat[t, i], p[t, i]))
+            f.write("\n")
+
+
+def pairwise_correlations(scores, tools, method, ranks=None):
+    """For Spearman's correlation, the ranks of the scores can be passed to compute them only once"""
+    matrices = correlation_matrices(scores, method, ranks)
     corr_matrices = dict()
-    out = "Openness\n"
-    corr_matrices['Openn'] = df_o.corr(method=method).round(3)
-    out += str(corr_matrices['Openn'])
-    corr_matrices['Openn'] = corr_matrices['Openn'].to_dict()
-    out += "\n\nConscientiousness\n"
-    corr_matrices['Consc'] = df_c.corr(method=method).round(3)
-    out += str(corr_matrices['Consc'])
-    corr_matrices['Consc'] = corr_matrices['Consc'].to_dict()
-    out += "\n\nExtraversion\n"
-    corr_matrices['Extra'] = df_e.corr(method=method).round(3)
-    out += str(corr_matrices['Extra'])
-    corr_matrices['Extra'] = corr_matrices['Extra'].to_dict()
-    out += "\n\nAgreeableness\n"
-    corr_matrices['Agree'] = df_a.corr(method=method).round(3)
-    out += str(corr_matrices['Agree'])
-    corr_matrices['Agree'] = corr_matrices['Agree'].to_dict()
-    out += "\n\nNeuro\n"
-    corr_matrices['Neuro'] = df_n.corr(method=method).round(3)
-    out += str(corr_matrices['Neuro'])
-    corr_matrices['Neuro'] = corr_matrices['Neuro'].to_dict()
+    out = list()
+    for t, (key, _, _) in enumerate(TRAITS):
+        corr_df = pd.DataFrame(matrices[t], index=tools, columns=tools).round(3)
+        out.append("{}\n{}".format(CORRELATION_HEADINGS[t], corr_df))
+        corr_matrices[key] = corr_df.to_dict()
     with open(file='results/phase1/{}.txt'.format(method), mode='w') as f:
-        f.write(out)
+        f.write("\n\n".join(out))
     with open(file='results/phase1/{}.json'.format(method), mode='w') as js_f:
         json.dump(corr_matrices, js_f, indent=4)
 
 
-def mailcorpus_stats():
-    emails_dict = dict()
+def mailcorpus_stats(corpus=None):
     no_emails = 0
-    all_bodies = ""
+    no_words = 0
     words_per_email = dict()
     tot_words_user = dict()
     no_emails_per_user = dict()
-    with open(file="dataset/goldstandard/mailcorpus-sha.json", mode="r") as jsf:
-        emails = json.load(jsf)
+    # unless the corpus is already loaded, emails are read one subject at a time from the columnar store
+    if corpus is None:
+        corpus = io_utils.load_mail_corpus()
+    for subject, emails in corpus.items():
         # count emails
-        for subject in emails:
-            no_emails_per_user[subject] = len(emails[subject])
-            no_emails += no_emails_per_user[subject]
-            bodies = ' '.join(emails[subject])
-            emails_dict[subject] = bodies
-            all_bodies += " " + bodies
-            tot_words_user[subject] = len(bodies.split())
-            words_per_email[subject] = tot_words_user[subject] / len(emails[subject])
+        no_emails_per_user[subject] = len(emails)
+        no_emails += no_emails_per_user[subject]
+        bodies = ' '.join(emails)
+        tot_words_user[subject] = len(bodies.split())
+        no_words += tot_words_user[subject]
+        words_per_email[subject] = tot_words_user[subject] / len(emails)
     # count addresses
     with open(file="dataset/goldstandard/address_list_sha.txt", mode="r") as f:
         no_subjects = len(f.readlines())
@@ -104,7 +103,7 @@ def mailcorpus_stats():
     with open(file="results/phase1/mail_corpus_stats.txt", mode="w") as f:
         f.write("No. of subjects: {}\n".format(no_subjects))
         f.write("Total no. of emails: {}\n".format(no_emails))
-        f.write("Total no. of words: {}\n".format(len(all_bodies.split())))
+        f.write("Total no. of words: {}\n".format(no_words))
         f.write("Avg. no. of emails per user: {:.2f} (Min {:.2f}, Max {:.2f}, Median {:.2f}, SD {:.2f})\n".format(
             no_emails / no_subjects,
             np.min(list(no_emails_per_user.values())),
@@ -126,73 +125,64 @@ def mailcorpus_stats():
             np.std(list(tot_words_user.values()))))
 
 
-def descriptive_stats(df_o, df_c, df_e, df_a, df_n, tools):
+def descriptive_stats(scores, tools):
+    # (statistic x trait x tool)
+    stats = np.stack([np.mean(scores, axis=-1), np.median(scores, axis=-1), np.min(scores, axis=-1),
+                      np.max(scores, axis=-1), np.std(scores, axis=-1)])
     with open(file="results/phase1/descriptive_stats.txt", mode="w") as f:
-        for tool in tools:
-            openness = df_o[tool].values
-            conscientiousness = df_c[tool].values
-            extraversion = df_e[tool].values
-            agreeableness = df_a[tool].values
-            neuroticism = df_n[tool].values
+        for i, tool in enumerate(tools):
             f.write("{}\n".format(tool))
-            f.write(
-                "Mean Openness {:.2f}, Median {:.2f} (Min {:.2f}, Max {:.2f}, SD {:.2f})\n".format(np.mean(openness),
-                                                                                                   np.median(openness),
-                                                                                                   min(openness),
-                                                                                                   max(openness),
-                                                                                                   np.std(openness)))
-            f.write(
-                "Mean Conscientiousness {:.2f}, Median {:.2f} (Min {:.2f}, Max {:.2f}, SD {:.2f})\n".format(
-                    np.mean(conscientiousness),
-                    np.median(conscientiousness),
-                    min(conscientiousness),
-                    max(conscientiousness),
-                    np.std(conscientiousness)))
-            f.write("Mean Extraversion {:.2f}, Median {:.2f} (Min {:.2f}, Max {:.2f}, SD {:.2f})\n".format(
-                np.mean(extraversion),
-                np.median(extraversion),
-                min(extraversion),
-                max(extraversion),
-                np.std(extraversion)))
-            f.write("Mean Agreeableness {:.2f}, Median {:.2f} (Min {:.2f}, Max {:.2f}, SD {:.2f})\n".format(
-                np.mean(agreeableness),
-                np.median(agreeableness),
-                min(agreeableness),
-                max(agreeableness),
-                np.std(agreeableness)))
-            f.write("Mean Neuroticism {:.2f}, Median {:.2f} (Min {:.2f}, Max {:.2f}, SD {:.2f})\n\n".format(
-                np.mean(neuroticism),
-                np.median(neuroticism),
-                min(neuroticism),
-                max(neuroticism),
-                np.std(neuroticism)))
-
-
-def save_plots(df_o, df_c, df_e, df_a, df_n, tools):
-    for tool in tools:
-        path = "results/phase1/{}-violins.png".format(tool)
-        plot_utils.save_violins_plot(df_o[tool], df_c[tool], df_e[tool], df_a[tool], df_n[tool], path)
+            for t, (_, name, _) in enumerate(TRAITS):
+                f.write("Mean {} {:.2f}, Median {:.2f} (Min {:.2f}, Max {:.2f}, SD {:.2f})\n".format(
+                    name, *stats[:, t, i]))
+            f.write("\n")
+
+
+def save_plots(scores, tools, workers=1, manifest_path=PLOT_MANIFEST):
+    """
+    Renders the QQ and violin plots of each tool in a pool of workers processes, skipping those whose
+    data did not change since their last rendering (all are rendered if manifest_path is None).
+    """
+    tasks = list()
+    for i, tool in enumerate(tools):
+        tasks.append(('qq', tool, scores[:, i], "results/phase1/qqplot_{}.png".format(tool)))
+        tasks.append(('violins', tool, scores[:, i], "results/phase1/{}-violins.png".format(tool)))
+    rendered = plot_utils.render_plots(tasks, workers=workers, manifest_path=manifest_path)
+    print("{} plots rendered, {} unchanged".format(len(rendered), len(tasks) - len(rendered)))
+
+
+def run(tool_results, goldstd_df, corpus=None, plot_workers=1):
+    """Computes all the analyses from the scores of each tool, see load_tool_results()"""
+    with profiling.stage('analyses/mailcorpus_stats'):
+        mailcorpus_stats(corpus)
+    scores, tools = build_scores(tool_results, goldstd_df)
+    with profiling.stage('analyses/descriptive_stats', items=scores.shape[-1]):
+        descriptive_stats(scores, tools)
+    with profiling.stage('analyses/normality_test', items=scores.shape[-1]):
+        normality_test(scores, tools)
+    # With large sample, where Pearson normality assumption is violated, this is not an issue.
+    # With small samples though, Spearman's correlation should be preferred.
+    # Source: On the Effects of Non-Normality on the Distribution of the Sample Product-Moment
+    #         Correlation Coefficient (Kowalski, 1975), url: www.jstor.org/pss/2346598
+    with profiling.stage('analyses/correlations', items=scores.shape[-1]):
+        pairwise_correlations(scores, tools, method="pearson")
+        pairwise_correlations(scores, tools, method="spearman", ranks=rank_scores(scores))
+    with profiling.stage('analyses/plots'):
+        save_plots(scores, tools, workers=plot_workers)
+
+
+def load_goldstd_subjects(gold_std):
+    """Gold standard entries of the subjects in the address list"""
+    with open(file="dataset/goldstandard/address_list_sha.txt", mode="r") as f:
+        emails_addr = [e.strip() for e in f.readlines()]
+    goldstd_df = gold_std.select(emails_addr)
+    goldstd_df.drop(goldstd_df.tail(1).index, inplace=True)  # remove extra line
+    return goldstd_df
 
 
 if __name__ == '__main__':
-    mailcorpus_stats()
-    with open(file="dataset/goldstandard/address_list_sha.txt", mode="r") as f:
-        emails_addr = [e.strip() for e in f.readlines()]
-        goldstd_df = io_utils.load_gold_standard()
-        goldstd_df = goldstd_df[goldstd_df['email'].isin(emails_addr)].reset_index(drop=True)
-        goldstd_df.drop(goldstd_df.tail(1).index, inplace=True)  # remove extra line
-
-        tools = {'LIWC': 'dataset/LIWC/results/results.json',
-                 'PI': 'dataset/PersonalityInsights/results/results.json',
-                 'PR': 'dataset/PersonalityRecognizer/results/results.json',
-                 'TP': 'dataset/twitpersonality/Results/results.json'}
-        df_o, df_c, df_e, df_a, df_n, col_names = build_dataframe(tools, goldstd_df)
-        descriptive_stats(df_o, df_c, df_e, df_a, df_n, col_names)
-        normality_test(df_o, df_c, df_e, df_a, df_n, col_names)
-        # With large sample, where Pearson normality assumption is violated, this is not an issue.
-        # With small samples though, Spearman's correlation should be preferred.
-        # Source: On the Effects of Non-Normality on the Distribution of the Sample Product-Moment
-        #         Correlation Coefficient (Kowalski, 1975), url: www.jstor.org/pss/2346598
-        pairwise_correlations(df_o, df_c, df_e, df_a, df_n, method="pearson")
-        pairwise_correlations(df_o, df_c, df_e, df_a, df_n, method="spearman")
-        save_plots(df_o, df_c, df_e, df_a, df_n, col_names)
+    # optional number of worker processes rendering the plots
+    plot_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    goldstd_df = load_goldstd_subjects(io_utils.load_gold_standard_store())
+    run({tool: load_tool_results(path) for tool, path in TOOLS.items()}, goldstd_df, plot_workers=plot_workers)
+    profiling.write_report('phase1_analysis')
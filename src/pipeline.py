@@ -0,0 +1,257 @@
+"""
+This module runs the phase 1 pipeline (ph1_1 to ph1_3) in a single Python process. The stages form a DAG:
+the data preparation, then the four tools, which run concurrently, and finally the analyses. The corpus, the
+gold standard and the scores of each tool are loaded once and shared in memory by all the stages.
+
+A stage is skipped when its inputs and its upstream stages did not change since its last successful run, and its
+outputs still exist. Fingerprints are stored in STATE_PATH.
+
+Usage: PYTHONPATH=.:./src:./twitpersonality python src/pipeline.py [options] [stage ...]
+If no stage is given, all the stages are run, otherwise only the given ones and the stages they depend on.
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from utils import io as io_utils
+from utils import profiling
+
+STATE_PATH = 'dataset/pipeline-state.json'
+CORPUS_PATH = 'dataset/goldstandard/mailcorpus-sha.json'
+ADDRESS_LIST_PATH = 'dataset/goldstandard/address_list_sha.txt'
+# Input of TwitPersonality written by the prepare stage with --pack
+TP_PACK_PATH = 'dataset/twitpersonality/Data.jsonl'
+
+"""
+A stage runs func(artifacts, options) after the stages in requires. Its fingerprint is computed from the
+files and directories in inputs and from the options it uses, and it is run again if any of its outputs is missing.
+"""
+Stage = namedtuple('Stage', ['name', 'func', 'requires', 'inputs', 'outputs', 'params'])
+
+
+class Artifacts:
+    """
+    Objects shared by the stages. An artifact is either put by the stage producing it, or loaded
+    on first use by its loader, e.g., when the stage producing it was skipped.
+    """
+
+    def __init__(self, loaders):
+        self._loaders = loaders
+        self._values = dict()
+        self._locks = {name: threading.Lock() for name in loaders}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            if name not in self._values:
+                self._values[name] = self._loaders[name]()
+            return self._values[name]
+
+    def put(self, name, value):
+        with self._lock:
+            self._values[name] = value
+
+
+def _load_senders():
+    with open(file=ADDRESS_LIST_PATH, mode="r") as f:
+        return {line.strip() for line in f.readlines()}
+
+
+def _load_corpus():
+    return io_utils.load_mail_corpus()
+
+
+def _load_scores(path):
+    import phase1_analysis
+    return lambda: phase1_analysis.load_tool_results(path)
+
+
+def _loaders():
+    import phase1_analysis
+    loaders = {'senders': _load_senders, 'corpus': _load_corpus, 'gold_standard': io_utils.load_gold_standard_store}
+    loaders.update({'scores/' + tool: _load_scores(path) for tool, path in phase1_analysis.TOOLS.items()})
+    return loaders
+
+
+# Stages, tool modules are imported by the stages using them
+
+def _prepare(artifacts, options):
+    import data_preparation
+    data_preparation.run(artifacts.get('senders'), artifacts.get('corpus'), pack=options.pack)
+
+
+def _personality_recognizer(artifacts, options):
+    import pr
+    if options.pr_resident:
+        corpus = artifacts.get('corpus')
+        scores = pr.run(artifacts.get('gold_standard'), artifacts.get('senders'), corpus.items())
+    else:
+        pr.run_recognizer()
+        scores = pr.run(artifacts.get('gold_standard'))
+    artifacts.put('scores/PR', scores)
+
+
+def _liwc(artifacts, options):
+    import liwc
+    artifacts.put('scores/LIWC', liwc.run(artifacts.get('gold_standard'), options.liwc, options.liwc_output))
+
+
+def _twitpersonality(artifacts, options):
+    import tp
+    artifacts.put('scores/TP', tp.run(artifacts.get('gold_standard'), workers=options.tp_workers,
+                                      mmap_mode='r' if options.tp_mmap else None))
+
+
+def _personality_insights(artifacts, options):
+    import ibmpi
+    artifacts.put('scores/PI', ibmpi.run(artifacts.get('gold_standard')))
+
+
+def _analyses(artifacts, options):
+    import phase1_analysis
+    goldstd_df = phase1_analysis.load_goldstd_subjects(artifacts.get('gold_standard'))
+    tool_results = {tool: artifacts.get('scores/' + tool) for tool in phase1_analysis.TOOLS}
+    phase1_analysis.run(tool_results, goldstd_df, artifacts.get('corpus'), plot_workers=options.plot_workers)
+
+
+def _liwc_output(options):
+    return options.liwc_output or 'dataset/LIWC/data/LIWC{}_output.csv'.format(options.liwc)
+
+
+def phase1_stages(options):
+    gold_standard = io_utils.GOLDSTANDARD_PATH
+    return [
+        Stage('prepare', _prepare, (), [CORPUS_PATH, ADDRESS_LIST_PATH],
+              ['dataset/LIWC/data/dataset.csv'] + ([TP_PACK_PATH] if options.pack else []), ('pack',)),
+        Stage('PR', _personality_recognizer, ('prepare',),
+              [CORPUS_PATH if options.pr_resident else 'dataset/PersonalityRecognizer/data', gold_standard],
+              ['dataset/PersonalityRecognizer/results/results.json'], ('pr_resident',)),
+        Stage('LIWC', _liwc, ('prepare',), [_liwc_output(options), gold_standard],
+              ['dataset/LIWC/results/results.json'], ('liwc', 'liwc_output')),
+        Stage('TP', _twitpersonality, ('prepare',),
+              ['dataset/twitpersonality/Data', TP_PACK_PATH, gold_standard],
+              ['dataset/twitpersonality/Results/results.json'], ()),
+        Stage('PI', _personality_insights, (), ['dataset/PersonalityInsights/data/dataset.json', gold_standard],
+              ['dataset/PersonalityInsights/results/results.json'], ()),
+        Stage('analyses', _analyses, ('PR', 'LIWC', 'TP', 'PI'), [CORPUS_PATH, ADDRESS_LIST_PATH, gold_standard],
+              ['results/phase1/descriptive_stats.txt', 'results/phase1/spearman.json'], ()),
+    ]
+
+
+def _file_stats(path):
+    """(path, size, mtime) of a file, or of all the files under a directory"""
+    if not os.path.exists(path):
+        return [(path, None, None)]
+    if os.path.isdir(path):
+        stats = list()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            stats.extend(_file_stats(os.path.join(root, name))[0] for name in sorted(files))
+        return stats
+    st = os.stat(path)
+    return [(path, st.st_size, st.st_mtime_ns)]
+
+
+def fingerprint(stage, upstream, options):
+    """Hash of the options used by the stage, the stats of its inputs and the fingerprints of its upstream stages"""
+    h = hashlib.sha256()
+    h.update(json.dumps([stage.name, [getattr(options, param) for param in stage.params],
+                         [_file_stats(path) for path in stage.inputs], upstream]).encode('utf-8'))
+    return h.hexdigest()
+
+
+def _select(stages, targets):
+    by_name = {stage.name: stage for stage in stages}
+    unknown = [name for name in targets if name not in by_name]
+    if unknown:
+        raise ValueError('Unknown stage(s): {}'.format(', '.join(unknown)))
+    selected = set()
+    pending = list(targets or by_name)
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            pending.extend(by_name[name].requires)
+    return [stage for stage in stages if stage.name in selected]
+
+
+def _load_state(state_path):
+    if os.path.exists(state_path):
+        with open(file=state_path, mode='r') as f:
+            return json.load(f)
+    return dict()
+
+
+def run_pipeline(stages, options, targets=(), force=False, jobs=4, state_path=STATE_PATH):
+    """
+    Runs the target stages (all by default) and the stages they depend on. Stages whose dependencies are done
+    run concurrently in a pool of jobs threads, and the first failure stops the pipeline.
+    """
+    stages = _select(stages, targets)
+    state = _load_state(state_path)
+    state_lock = threading.Lock()
+    artifacts = Artifacts(_loaders())
+    fingerprints = dict()
+
+    def run_stage(stage):
+        fp = fingerprint(stage, [fingerprints[name] for name in stage.requires], options)
+        if not force and state.get(stage.name) == fp and all(os.path.exists(path) for path in stage.outputs):
+            print("[{}] Up to date, skipped".format(stage.name))
+            return fp
+        print("[{}] Started".format(stage.name))
+        start = time.perf_counter()
+        with profiling.stage('pipeline/' + stage.name):
+            stage.func(artifacts, options)
+        print("[{}] Done in {:.1f}s".format(stage.name, time.perf_counter() - start))
+        with state_lock:
+            state[stage.name] = fp
+            with open(file=state_path, mode='w') as f:
+                json.dump(state, f, indent=4)
+        return fp
+
+    pending = list(stages)
+    running = dict()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while pending or running:
+            for stage in [s for s in pending if all(name in fingerprints for name in s.requires)]:
+                pending.remove(stage)
+                running[executor.submit(run_stage, stage)] = stage
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    fingerprints[stage.name] = future.result()
+                except Exception:
+                    print("[{}] Failed".format(stage.name))
+                    pending.clear()
+                    wait(running)
+                    raise
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs the phase 1 pipeline in a single process.')
+    parser.add_argument('stages', nargs='*', help='stages to run: prepare, PR, LIWC, TP, PI, analyses')
+    parser.add_argument('--force', action='store_true', help='run the stages even if their inputs did not change')
+    parser.add_argument('--jobs', type=int, default=4, help='max number of stages running concurrently')
+    parser.add_argument('--liwc', default='2007', help='LIWC dictionary version, 2007 or 2015')
+    parser.add_argument('--liwc-output', default=None, help='LIWC output file, e.g., the one of liwc_counter.py')
+    parser.add_argument('--pack', action='store_true',
+                        help='write the input of TwitPersonality as a single JSON Lines file')
+    parser.add_argument('--tp-workers', type=int, default=1, help='worker processes of TwitPersonality')
+    parser.add_argument('--tp-mmap', action='store_true', help='memory-map the SVM models of TwitPersonality')
+    parser.add_argument('--pr-resident', action='store_true',
+                        help='score with a resident Personality Recognizer process')
+    parser.add_argument('--plot-workers', type=int, default=1, help='worker processes rendering the plots')
+    args = parser.parse_args()
+    options = argparse.Namespace(liwc=args.liwc, liwc_output=args.liwc_output, pack=args.pack,
+                                 tp_workers=args.tp_workers, tp_mmap=args.tp_mmap, pr_resident=args.pr_resident,
+                                 plot_workers=args.plot_workers)
+    run_pipeline(phase1_stages(options), options, targets=args.stages, force=args.force, jobs=args.jobs)
+    profiling.write_report('pipeline')
@@ -1,42 +1,117 @@
-import re
-from io import StringIO
+import subprocess
+import sys
 
 import numpy as np
 import pandas as pd
 
 from utils import io as io_utils
 from utils import math as math_utils
+from utils import profiling
+from utils.recognizer import ResidentRecognizer
 
+APP_DIR = 'PersonalityRecognizer'
+OUTPUT_PATH = 'dataset/PersonalityRecognizer/results/output.txt'
 tab_header = ['email', 'Extra', 'Neuro', 'Agree', 'Consc', 'Openn']
 
 
-def get_results_table(txt):
-    table = txt.strip().split('\n\n\n\n')[3]
-    hashes = re.findall(r'(.*)\.txt', table)
-    return hashes, table.replace('.txt ', '')
+# Columns of the score table in the Personality Recognizer output
+_TABLE_COLUMNS = {'Extra': 'Extra', 'Emoti': 'Neuro', 'Agree': 'Agree', 'Consc': 'Consc', 'Openn': 'Openn'}
 
 
-def parse_results_table(hashes, data):
-    t_array = np.genfromtxt(StringIO(data), delimiter='\t', skip_header=1, usecols=(0, 1, 2, 3, 4, 5))
-    df = pd.DataFrame(t_array, columns=tab_header)
-    df['email'] = hashes
-    return df
+def _is_table_header(fields):
+    return fields[0] == 'File' and len(fields) > 1 and all(field in _TABLE_COLUMNS for field in fields[1:])
 
 
-if __name__ == '__main__':
-    with open(file="dataset/PersonalityRecognizer/results/output.txt", mode="r") as f:
-        text = '\n'.join(f.readlines())
-    hashed_email_addresses, txt_table = get_results_table(text)
-    res_df = parse_results_table(hashed_email_addresses, txt_table)
-    gold_std_df = io_utils.load_gold_standard()
+def parse_results_table(lines, capacity=1024):
+    """
+    Parses the score table of the Personality Recognizer output in a single pass over its lines.
+    The table is detected by its header, and the scores are stored in a preallocated array (doubled
+    when full), in the column order of tab_header. Malformed rows are reported and skipped.
+    """
+    hashes = list()
+    malformed = list()
+    scores = np.empty((capacity, len(tab_header) - 1))
+    columns = None
+    for line_no, line in enumerate(lines, start=1):
+        fields = [field.strip() for field in line.rstrip('\n').split('\t')]
+        if columns is None:
+            if _is_table_header(fields):
+                columns = [tab_header.index(_TABLE_COLUMNS[field]) - 1 for field in fields[1:]]
+            continue
+        if not line.strip():
+            if hashes or malformed:
+                break  # end of table
+            continue
+        try:
+            if len(fields) != len(columns) + 1 or not fields[0].endswith('.txt'):
+                raise ValueError
+            values = [float(value) for value in fields[1:]]
+        except ValueError:
+            malformed.append((line_no, line.rstrip('\n')))
+            continue
+        if len(hashes) == len(scores):
+            scores = np.concatenate([scores, np.empty_like(scores)])
+        scores[len(hashes), columns] = values
+        hashes.append(fields[0][:-len('.txt')])
+
+    if columns is None:
+        raise ValueError('Score table not found in the Personality Recognizer output')
+    for line_no, line in malformed:
+        print("Warning: malformed row at line {}: {}".format(line_no, line))
+    df = pd.DataFrame(scores[:len(hashes)], columns=tab_header[1:])
+    df.insert(0, 'email', hashes)
+    return hashes, df
+
+
+def score_resident(senders, corpus):
     """
-    Gold standard contains more developers than the dataset
-    So, we remove all the useless entries
+    Scores the developers with a resident Personality Recognizer process, streaming their
+    emails from the corpus rather than writing and rescanning one file per developer.
     """
-    gold_std_df = gold_std_df.loc[gold_std_df['email'].isin(hashed_email_addresses)]
-    rescaled_res_df = math_utils.rescale(res_df, old_min=1, old_max=7, new_min=1, new_max=5)
-    MAE = math_utils.compute_mae(rescaled_res_df, gold_std_df)
-    RMSE = math_utils.compute_rmse(rescaled_res_df, gold_std_df)
-    io_utils.store_results('dataset/PersonalityRecognizer/results/mae.json', MAE,
-                           'dataset/PersonalityRecognizer/results/rmse.json', RMSE,
-                           'dataset/PersonalityRecognizer/results/results.json', rescaled_res_df)
+    documents = ((hashed_addr, '. '.join(messages) + '\n') for hashed_addr, messages in corpus
+                 if hashed_addr in senders)
+    with ResidentRecognizer(model=4, self_assessed=True) as recognizer:
+        recognizer.add(documents)
+        scores, errors = recognizer.score()
+    for hashed_addr, error in errors.items():
+        print("Exception when analyzing subject {}.".format(hashed_addr))
+        print(error)
+    hashes = list(scores)
+    df = pd.DataFrame([scores[hashed_addr] for hashed_addr in hashes], columns=tab_header[1:])
+    df.insert(0, 'email', hashes)
+    return hashes, df
+
+
+def run_recognizer(data_dir='../dataset/PersonalityRecognizer/data'):
+    """Runs the corpus analysis of the Personality Recognizer on data_dir (relative to APP_DIR), as ph1_2 does"""
+    with open(file=OUTPUT_PATH, mode='w') as f, profiling.stage('pr/recognizer'):
+        subprocess.run(['bash', 'PersonalityRecognizer.sh', '-i', data_dir, '-d', '-t', '2', '-m', '4'],
+                       cwd=APP_DIR, stdout=f, check=True)
+
+
+def run(gold_std, senders=None, corpus=None):
+    """
+    Scores the developers from the output of run_recognizer() or, if the corpus is given, with a resident
+    Personality Recognizer process.
+    """
+    if corpus is not None:
+        with profiling.stage('pr/resident') as record:
+            hashed_email_addresses, res_df = score_resident(senders, corpus)
+            record.items = len(hashed_email_addresses)
+    else:
+        with open(file=OUTPUT_PATH, mode="r") as f, profiling.stage('pr/parse_output') as record:
+            hashed_email_addresses, res_df = parse_results_table(f)
+            record.items = len(hashed_email_addresses)
+    rescaled_res_df = math_utils.rescale(res_df, old_min=1, old_max=7, new_min=1, new_max=5, inplace=True)
+    math_utils.store_evaluation(rescaled_res_df, gold_std, 'dataset/PersonalityRecognizer/results')
+    return rescaled_res_df
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'resident':
+        with open(file="dataset/goldstandard/address_list_sha.txt", mode="r") as f:
+            hashed_senders = {line.strip() for line in f.readlines()}
+        run(io_utils.load_gold_standard_store(), hashed_senders, io_utils.load_mail_corpus().items())
+    else:
+        run(io_utils.load_gold_standard_store())
+    profiling.write_report('pr')
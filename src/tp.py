@@ -1,52 +1,185 @@
+import argparse
+import json
 import os
 
 import joblib
 import numpy as np
 import pandas as pd
 
-from twitpersonality.training import datasetUtils, embeddings
+from twitpersonality.training import embeddings
+from utils import fasttext as fasttext_utils
 from utils import io as io_utils
 from utils import math as math_utils
+from utils import pool as pool_utils
+from utils import profiling
 
+MODEL_PATH = "dataset/twitpersonality/Models/MPBig/SVM_Big_conc_{}.pkl"
+TRAITS = {"O": 'Openn', "C": 'Consc', "E": 'Extra', "A": 'Agree', "N": 'Neuro'}
+DATA_DIR = "dataset/twitpersonality/Data"
+# Written by data_preparation.py --pack in place of the files in DATA_DIR
+PACK_PATH = "dataset/twitpersonality/Data.jsonl"
+# Number of users scored by a worker at a time
+CHUNK_SIZE = 100
 
-def get_profile_twit_pers():
-    word_dict = datasetUtils.parseFastText("twitpersonality/FastText/dataset.vec")
+# Embeddings and models of the current process
+_worker_state = dict()
 
-    content = os.listdir("dataset/twitpersonality/Data")
-    email_addr = list()
+
+def load_models(mmap_mode=None):
+    """
+    Loads the SVM model of each trait once. With mmap_mode='r', the arrays of the
+    models are memory-mapped rather than read in memory.
+    """
+    return {trait: joblib.load(MODEL_PATH.format(trait), mmap_mode=mmap_mode) for trait in TRAITS}
+
+
+def predict_scores(models, contents):
+    """
+    The feature matrices of all the users are stacked, so that each model predicts
+    them in a single call. The predictions are then split back per user and averaged.
+    """
+    offsets = np.cumsum([len(content) for content in contents])[:-1]
+    features = np.vstack(contents)
+    scores = dict()
+    with profiling.stage('tp/prediction', items=len(contents)):
+        for trait, model in models.items():
+            preds = np.split(np.asarray(model.predict(features)), offsets)
+            scores[trait] = [float(str(np.mean(user_preds))[0:5]) for user_preds in preds]
+    return scores
+
+
+def _init_worker(vec_path, mmap_mode):
+    """
+    Loads the embeddings and the models of the process once. The embeddings are memory-mapped,
+    so their pages are shared by all the workers rather than copied.
+    """
+    if not _worker_state:
+        _worker_state['word_dict'] = fasttext_utils.load_fasttext(vec_path)
+        _worker_state['models'] = load_models(mmap_mode)
+
+
+def _init_pool_worker(vec_path, mmap_mode):
+    with profiling.stage('tp/load'):
+        _init_worker(vec_path, mmap_mode)
+
+
+def list_users():
+    """
+    Returns the (hashed address, reference) of each user, in hashed address order, without reading their emails.
+    The reference is the name of the user file in DATA_DIR or, if PACK_PATH exists, the (offset, length) of the
+    line of the user in it.
+    """
+    if not os.path.exists(PACK_PATH):
+        return sorted((file.split('.')[0], file) for file in os.listdir(DATA_DIR))
+    users = list()
+    decoder = json.JSONDecoder()
+    offset = 0
+    with open(file=PACK_PATH, mode='rb') as f:
+        for line in f:
+            if line.strip():
+                # each line is a {hashed address: emails} object, only its key is decoded
+                sha, _ = decoder.raw_decode(line.decode('utf-8'), line.index(b'"'))
+                users.append((sha, (offset, len(line))))
+            offset += len(line)
+    return sorted(users)
+
+
+def read_user(reference):
+    """Emails of a user, see list_users()"""
+    if isinstance(reference, str):
+        with open(file=os.path.join(DATA_DIR, reference), mode="r") as f:
+            return f.read()
+    offset, length = reference
+    with open(file=PACK_PATH, mode='rb') as f:
+        f.seek(offset)
+        user = json.loads(f.read(length).decode('utf-8'))
+    return next(iter(user.values()))
+
+
+def _embed_user(word_dict, user_emails):
+    # threshold: at least 600 words per user
+    user_content = embeddings.transformTextForTesting(embed_dictionary=word_dict, length_threshold=3,
+                                                      documents=user_emails.split('.'), operation="conc")
+    user_content = np.asarray(user_content)
+    if len(user_content) == 0:
+        raise ValueError("No document left after embedding.")
+    return user_content
+
+
+def _score_users(user_refs):
+    """
+    Scores a chunk of (hashed address, reference) users, whose emails are read here, see list_users(),
+    and returns the score rows along with the (subject, error) pairs of the users that could not be analyzed.
+    """
+    users = list()
+    contents = list()
+    failures = list()
+    with profiling.stage('tp/embedding', items=len(user_refs)):
+        for sha, reference in user_refs:
+            try:
+                contents.append(_embed_user(_worker_state['word_dict'], read_user(reference)))
+                users.append(sha)
+            except Exception as e:
+                failures.append((sha, str(e)))
+    if not contents:
+        return list(), failures
+
+    try:
+        scores = predict_scores(_worker_state['models'], contents)
+    except Exception as e:
+        return list(), failures + [(sha, str(e)) for sha in users]
+    rows = list()
+    for i, sha in enumerate(users):
+        row_dict = {'email': sha}
+        row_dict.update({col_name: scores[trait][i] for trait, col_name in TRAITS.items()})
+        rows.append(row_dict)
+    return rows, failures
+
+
+def get_profile_twit_pers(mmap_mode=None, workers=1, chunk_size=CHUNK_SIZE):
+    """
+    Users are scored in hashed address order. With workers > 1, chunks of chunk_size users are
+    scored by a pool of processes, which memory-map the models (mmap_mode='r') unless another mode
+    is given, so that their arrays are shared rather than read by each worker; otherwise all the
+    users are scored in a single chunk. A user that cannot be analyzed is reported and skipped.
+    """
+    vec_path = "twitpersonality/FastText/dataset.vec"
+
+    # only the references of the users are sent to the workers, which read the emails themselves
+    content = list_users()
+    email_addr = [sha for sha, _ in content]
     scores_list = list()
-    for file in content:
-        sha = file.split('.')[0]
-        email_addr.append(sha)
-
-        try:
-            user_emails = open(file=os.path.join("dataset/twitpersonality/Data", file), mode="r").read()
-            # threshold: at least 600 words per user
-            content = embeddings.transformTextForTesting(embed_dictionary=word_dict, length_threshold=3,
-                                                         documents=user_emails.split('.'), operation="conc")
-        except Exception as e:
-            print("Exception when analyzing subject {}.".format(sha))
-            print(e)
-            continue
-
-        scores = dict()
-        for trait in ["O", "C", "E", "A", "N"]:
-            model = joblib.load("dataset/twitpersonality/Models/MPBig/SVM_Big_conc_" + trait + ".pkl")
-            preds = model.predict(content)
-            scores[trait] = float(str(np.mean(np.array(preds)))[0:5])
-        row_dict = {'email': sha, 'Openn': scores["O"], 'Consc': scores["C"], 'Extra': scores["E"],
-                    'Agree': scores["A"], 'Neuro': scores["N"]}
-        scores_list.append(row_dict)
+    failures = list()
+    if workers > 1:
+        mmap_mode = mmap_mode or 'r'
+        chunks = [content[start:start + chunk_size] for start in range(0, len(content), chunk_size)]
+        with pool_utils.spawn_pool(workers, initializer=_init_pool_worker, initargs=(vec_path, mmap_mode)) as pool:
+            for (rows, chunk_failures), stats in pool.imap(pool_utils.Profiled(_score_users), chunks):
+                scores_list.extend(rows)
+                failures.extend(chunk_failures)
+                profiling.merge(stats)
+    else:
+        _init_worker(vec_path, mmap_mode)
+        scores_list, failures = _score_users(content)
 
+    for sha, error in failures:
+        print("Exception when analyzing subject {}.".format(sha))
+        print(error)
     scores_df = pd.DataFrame(data=scores_list, columns=('email', 'Openn', 'Consc', 'Extra', 'Agree', 'Neuro'))
     return scores_df, email_addr
 
 
+def run(gold_std, workers=1, mmap_mode=None):
+    pred_scores_df, hashed_email_addresses = get_profile_twit_pers(mmap_mode=mmap_mode, workers=workers)
+    math_utils.store_evaluation(pred_scores_df, gold_std, 'dataset/twitpersonality/Results')
+    return pred_scores_df
+
+
 if __name__ == '__main__':
-    gold_std_df = io_utils.load_gold_standard()
-    pred_scores_df, hashed_email_addresses = get_profile_twit_pers()
-    MAE = math_utils.compute_mae(pred_scores_df, gold_std_df)
-    RMSE = math_utils.compute_rmse(pred_scores_df, gold_std_df)
-    io_utils.store_results('dataset/twitpersonality/Results/mae.json', MAE,
-                           'dataset/twitpersonality/Results/rmse.json', RMSE,
-                           'dataset/twitpersonality/Results/results.json', pred_scores_df)
+    parser = argparse.ArgumentParser(description='Scores the developers with TwitPersonality.')
+    parser.add_argument('workers', type=int, nargs='?', default=1, help='number of worker processes')
+    parser.add_argument('--mmap', action='store_true',
+                        help='memory-map the arrays of the SVM models (always done with workers > 1)')
+    args = parser.parse_args()
+    run(io_utils.load_gold_standard_store(), workers=args.workers, mmap_mode='r' if args.mmap else None)
+    profiling.write_report('tp')
@@ -1,17 +1,72 @@
-import nltk
-import rpy2.robjects as robjects
-from rpy2.robjects.packages import importr
+"""
+Resources of the email cleaning, loaded on first use rather than at import: the NLTK data, downloaded only if
+missing, and the NLoN model. The model is trained once and saved as an .rds file keyed by the hash of its
+training data, so that later processes, e.g., the cleaning workers, only read it.
+"""
+import hashlib
+import os
+import threading
+from functools import lru_cache
 
-nltk.download('punkt')
-nltk.download('stopwords')
+from utils.io.files import atomic_save
+
+# Path to NLoN training data
+NLON_TRAINING_DATA = os.path.join(os.path.dirname(__file__), 'training_data.rda')
+# Path to the trained NLoN model, formatted with the hash of the training data
+NLON_MODEL_PATH = os.path.join(os.path.dirname(__file__), 'nlon-model-{}.rds')
+# NLTK packages used by the cleaning, and the resource looked up to check they are installed
+NLTK_DATA = {'punkt': 'tokenizers/punkt', 'stopwords': 'corpora/stopwords'}
+
+punc = '''()-[]{};:'"\, <>/?@#$%^&*_~'''
+
+_nlon_lock = threading.Lock()
+_nlon = None
+
+
+@lru_cache(maxsize=None)
+def training_data_hash():
+    with open(file=NLON_TRAINING_DATA, mode='rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def nlon_model_path():
+    return NLON_MODEL_PATH.format(training_data_hash()[:16])
+
+
+@lru_cache(maxsize=None)
+def ensure_nltk_data():
+    """Downloads the NLTK packages that are not installed yet"""
+    import nltk
+    for package, resource in NLTK_DATA.items():
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            nltk.download(package)
 
 
 def training_nlon():
+    import rpy2.robjects as robjects
+    from rpy2.robjects.packages import importr
     _nlon = importr('NLoN')
-    # Path to NLoN training data
-    robjects.r['load']('src/utils/email/training_data.rda')
+    robjects.r['load'](NLON_TRAINING_DATA)
     return _nlon, _nlon.NLoNModel(robjects.r['text'], robjects.r['rater'])
 
 
-nlon, nlon_model = training_nlon()
-punc = '''()-[]{};:'"\, <>/?@#$%^&*_~'''
+def load_nlon():
+    """
+    Returns the NLoN package and model of this process. R is started on the first call, and the model
+    is read from nlon_model_path(), or trained and saved there if the training data changed.
+    """
+    global _nlon
+    with _nlon_lock:
+        if _nlon is None:
+            import rpy2.robjects as robjects
+            from rpy2.robjects.packages import importr
+            model_path = nlon_model_path()
+            if os.path.exists(model_path):
+                _nlon = importr('NLoN'), robjects.r['readRDS'](model_path)
+            else:
+                print("Training NLoN, the model is saved in {}".format(model_path))
+                _nlon = training_nlon()
+                atomic_save(model_path, lambda tmp_path: robjects.r['saveRDS'](_nlon[1], tmp_path))
+        return _nlon
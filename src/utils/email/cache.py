@@ -0,0 +1,52 @@
+"""
+On-disk cache of the cleaned email bodies. Entries are addressed by the hash of the raw message body and by the
+fingerprint of the cleaning configuration, so a message is cleaned again only when it is new or when the cleaning
+steps change.
+"""
+import hashlib
+import sqlite3
+
+# Max number of host parameters in a single SQLite statement
+_MAX_VARIABLES = 900
+
+
+def body_hash(message_body):
+    return hashlib.sha256(message_body.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+class CleanedBodyCache:
+    def __init__(self, path, fingerprint):
+        self.fingerprint = fingerprint
+        self._conn = sqlite3.connect(path)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS cleaned_bodies ('
+                           'body_sha TEXT NOT NULL, '
+                           'config_sha TEXT NOT NULL, '
+                           'clean_body TEXT NOT NULL, '
+                           'PRIMARY KEY (body_sha, config_sha)) WITHOUT ROWID')
+        self._conn.commit()
+
+    def get_many(self, keys):
+        """Returns a dict mapping the cached keys to their clean body, missing keys are left out"""
+        keys = list(keys)
+        found = dict()
+        for start in range(0, len(keys), _MAX_VARIABLES):
+            batch = keys[start:start + _MAX_VARIABLES]
+            query = 'SELECT body_sha, clean_body FROM cleaned_bodies WHERE config_sha = ? AND body_sha IN ({})'.format(
+                ','.join('?' * len(batch)))
+            found.update(self._conn.execute(query, [self.fingerprint] + batch))
+        return found
+
+    def put_many(self, items):
+        """Stores the (key, clean body) pairs, an empty body marks a message dropped by the cleaning"""
+        self._conn.executemany('INSERT OR REPLACE INTO cleaned_bodies VALUES (?, ?, ?)',
+                               ((key, self.fingerprint, clean_body) for key, clean_body in items))
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,120 @@
+"""
+Near-duplicate detection of email bodies with MinHash and locality-sensitive hashing (LSH), run on the raw bodies
+before the cleaning. Each body is reduced to the set of its word shingles, after dropping quoted lines and
+normalizing case and whitespace, and then to a MinHash signature. Signatures are split in bands, and a body is only
+compared with the earlier bodies sharing at least one band, so the whole corpus is processed in linear time.
+A body whose estimated Jaccard similarity with an earlier body of the same sender (or of any sender) reaches the
+threshold is dropped, and the first copy is kept.
+"""
+import json
+import re
+import zlib
+
+import numpy as np
+
+from utils.email.cache import body_hash
+
+THRESHOLD = 0.8
+NUM_PERM = 128
+# Number of words per shingle
+SHINGLE_SIZE = 5
+
+_QUOTED_LINE = re.compile(r'^\s*>.*$', re.MULTILINE)
+_WORD = re.compile(r'\w+')
+
+
+def shingles(body, size=SHINGLE_SIZE):
+    """CRC32 hashes of the word shingles of a body, quoted lines excluded, none if it has fewer than size words"""
+    words = _WORD.findall(_QUOTED_LINE.sub('', body.replace('\\n', '\n')).lower())
+    if len(words) < size:
+        return np.zeros(0, dtype=np.uint64)
+    return np.unique(np.fromiter((zlib.crc32(' '.join(words[i:i + size]).encode('utf-8', 'surrogatepass'))
+                                  for i in range(len(words) - size + 1)), dtype=np.uint64))
+
+
+def lsh_bands(threshold, num_perm):
+    """
+    Number of bands (and rows per band) of the LSH index, chosen so that the similarity at which two bodies
+    become candidates, (1 / bands) ** (1 / rows), is the closest to the threshold without exceeding it.
+    """
+    options = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    below = [(bands, rows) for bands, rows in options if (1 / bands) ** (1 / rows) <= threshold]
+    return max(below or options[:1], key=lambda option: (1 / option[0]) ** (1 / option[1]))
+
+
+class Deduplicator:
+    """
+    Streaming near-duplicate filter: bodies are given one at a time, in corpus order, to is_duplicate(). Unless
+    across_senders is set, a body is only compared with the earlier bodies of the same sender.
+    """
+
+    def __init__(self, threshold=THRESHOLD, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE, across_senders=False,
+                 seed=1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.across_senders = across_senders
+        self.bands, self.rows = lsh_bands(threshold, num_perm)
+        rng = np.random.default_rng(seed)
+        # multiply-shift hash functions, the arithmetic wraps around modulo 2 ** 64
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self._buckets = dict()
+        self._signatures = list()
+        self._kept = list()
+        self.n_messages = 0
+        self.n_skipped = 0
+        self.dropped = list()
+
+    def signature(self, body):
+        """MinHash signature of a body, None if it has no shingle"""
+        x = shingles(body, self.shingle_size)
+        if len(x) == 0:
+            return None
+        return ((np.outer(x, self._a) + self._b) >> np.uint64(32)).min(axis=0)
+
+    def is_duplicate(self, address, body, key=None):
+        """
+        Returns True if the body is a near-duplicate of a body seen before, which is then recorded in dropped;
+        otherwise the body is indexed and False is returned. The key is the hash of the body, see body_hash().
+        Bodies too short to have a shingle, e.g., made only of quoted lines, are neither dropped nor indexed,
+        since they would all look alike.
+        """
+        self.n_messages += 1
+        sig = self.signature(body)
+        if sig is None:
+            self.n_skipped += 1
+            return False
+        key = key or body_hash(body)
+        scope = None if self.across_senders else address
+        bands = [(scope, band, sig[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+        candidates = {i for band in bands for i in self._buckets.get(band, ())}
+        if candidates:
+            candidates = sorted(candidates)
+            similarities = (np.stack([self._signatures[i] for i in candidates]) == sig).mean(axis=1)
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                original_address, original_sha = self._kept[candidates[best]]
+                self.dropped.append({'email_address': address, 'body_sha': key,
+                                     'duplicate_of': {'email_address': original_address, 'body_sha': original_sha},
+                                     'similarity': round(float(similarities[best]), 3)})
+                return True
+        index = len(self._signatures)
+        self._signatures.append(sig)
+        self._kept.append((address, key))
+        for band in bands:
+            self._buckets.setdefault(band, list()).append(index)
+        return False
+
+    def report(self):
+        per_sender = dict()
+        for d in self.dropped:
+            per_sender[d['email_address']] = per_sender.get(d['email_address'], 0) + 1
+        return {'threshold': self.threshold, 'num_perm': self.num_perm, 'bands': self.bands, 'rows': self.rows,
+                'shingle_size': self.shingle_size, 'across_senders': self.across_senders,
+                'messages': self.n_messages, 'skipped': self.n_skipped, 'dropped': len(self.dropped),
+                'dropped_per_sender': per_sender, 'dropped_messages': self.dropped}
+
+    def write_report(self, path):
+        with open(file=path, mode='w') as js_f:
+            json.dump(self.report(), js_f, indent=4)
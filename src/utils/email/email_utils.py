@@ -1,22 +1,40 @@
 import hashlib
 import json
+import logging
 import os
+import time
 import warnings
+from collections import deque
+from functools import lru_cache, partial
+from itertools import islice
 
-import rpy2.robjects as robjects
-from bs4 import BeautifulSoup as Bs
-from cleantext import clean
-from email_reply_parser import EmailReplyParser
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from polyglot.detect import Detector
-from polyglot.detect.base import logger as polyglot_logger
-
-from utils.email import nlon, nlon_model, punc
+from utils.email import NLON_TRAINING_DATA, ensure_nltk_data, load_nlon, nlon_model_path, punc
+from utils.email.cache import CleanedBodyCache, body_hash
+from utils import profiling
+from utils.io.jsonstream import iter_json_array
+from utils.pool import Profiled, spawn_pool
 
 warnings.filterwarnings(action="ignore", category=UserWarning, module='bs4')
 warnings.filterwarnings(action="ignore", message="bad escape \\? at position *")
-polyglot_logger.setLevel("ERROR")
+# logger of polyglot.detect, which is imported on first use like the other cleaning libraries
+logging.getLogger('polyglot.detect.base').setLevel("ERROR")
+
+# Max number of lines classified by NLoN in a single call
+NLON_BATCH_SIZE = 1000
+# Number of messages whose lines are pooled before calling NLoN
+CHUNK_SIZE = 50
+# Max number of words whose language verdict is kept in memory
+LANG_CACHE_SIZE = 2 ** 18
+
+# Path to the cache of cleaned email bodies (None to disable it)
+CACHE_PATH = 'dataset/raw/mailcorpus-cache.sqlite'
+# Bump whenever the cleaning steps change, to invalidate the cached bodies
+CLEANING_VERSION = 1
+CLEAN_TEXT_OPTIONS = dict(lang="en", fix_unicode=True, to_ascii=True, lower=True, no_urls=True, no_emails=True,
+                          no_phone_numbers=True, no_numbers=True, no_digits=True, no_currency_symbols=True,
+                          replace_with_url="http://replaced.url", replace_with_email="replaced@email.addr.es",
+                          replace_with_phone_number="555-555-555", replace_with_number="0", replace_with_digit="0",
+                          replace_with_currency_symbol="$")
 
 contractions = {
     "ain't": "am not / are not",
@@ -139,21 +157,31 @@ contractions = {
 }
 
 
+@lru_cache(maxsize=None)
+def get_stop_words():
+    """Stop words of all the languages available in NLTK, loaded once"""
+    from nltk.corpus import stopwords
+    ensure_nltk_data()
+    return frozenset(stopwords.words())
+
+
 def _remove_stopwords_nonenglish_punctuation(text):
     """
     In order to perform stop words removal,we the function word_tokenize which
     splits the original text into tokens. Using list comprehension we check if
     the word is a stop word or not.
     """
-    token = word_tokenize(text)
-    new_words = []
-    for word in token:
-        new_word = word.lower()
-        new_words.append(new_word)
-    tokens_without_sw = [word for word in new_words if not word.lower() in stopwords.words()]
+    from nltk.tokenize import word_tokenize
+    stop_words = get_stop_words()
+    with profiling.stage('email/tokenization') as record:
+        token = word_tokenize(text)
+        record.items = len(token)
+        new_words = [word.lower() for word in token]
+        tokens_without_sw = [word for word in new_words if word not in stop_words]
 
     """Remove only words classified as 'undefined' ('un')"""
-    english_tokens_without_sw = [word for word in tokens_without_sw if not _is_word_lang_undefined(word)]
+    with profiling.stage('email/language_detection', items=len(tokens_without_sw)):
+        english_tokens_without_sw = [word for word in tokens_without_sw if not _is_word_lang_undefined(word)]
 
     """
     We remove every punctuation mark with the exception of: 
@@ -164,38 +192,72 @@ def _remove_stopwords_nonenglish_punctuation(text):
     return " ".join(new_words)
 
 
+@lru_cache(maxsize=LANG_CACHE_SIZE)
 def _is_word_lang_undefined(word):
+    """
+    Word frequencies are Zipfian, so the verdicts are cached and shared by all the
+    messages cleaned in this process.
+    """
+    from polyglot.detect import Detector
     detector = Detector(word, quiet=True)
     return detector.language.code == 'un'
 
 
 def _clean_body(text):
-    clean_message_body = clean(text, lang="en", fix_unicode=True, to_ascii=True, lower=True, no_urls=True,
-                               no_emails=True, no_phone_numbers=True, no_numbers=True, no_digits=True,
-                               no_currency_symbols=True, replace_with_url="http://replaced.url",
-                               replace_with_email="replaced@email.addr.es", replace_with_phone_number="555-555-555",
-                               replace_with_number="0", replace_with_digit="0", replace_with_currency_symbol="$")
+    from cleantext import clean
+    with profiling.stage('email/clean_text'):
+        clean_message_body = clean(text, **CLEAN_TEXT_OPTIONS)
     return clean_message_body
 
 
-def _remove_lines_of_code(text):
+def _strip_html(text):
+    # imported outside the try, a missing bs4 must not leave the HTML in the bodies
+    from bs4 import BeautifulSoup as Bs
     try:
         soup = Bs(text, 'html.parser')
-        clean_message_body = soup.text.strip()
+        return soup.text.strip()
     except Exception as e:
         print("Warning: {} ".format(type(e)))
-        clean_message_body = text.strip()
-    message_by_lines = clean_message_body.splitlines()
-    list_length = len(message_by_lines)
-    index = 0
-    for count in range(0, list_length):
-        text_line = robjects.StrVector([message_by_lines[index]])
-        if nlon.NLoNPredict(nlon_model, text_line)[0] == 'Not':
-            del message_by_lines[index]
-        else:
-            index += 1
-    clean_message_body = '\n'.join(message_by_lines)
-    return clean_message_body.strip()
+        return text.strip()
+
+
+def _classify_lines(lines, batch_size=NLON_BATCH_SIZE):
+    """
+    NLoN labels each line as natural language or not ('Not'). Lines are sent to R in
+    vectors of at most batch_size elements (all at once if None), so that the features
+    are extracted in a single vectorized call rather than one rpy2 round trip per line.
+    """
+    import rpy2.robjects as robjects
+    nlon, nlon_model = load_nlon()
+    labels = list()
+    if batch_size is None:
+        batch_size = max(len(lines), 1)
+    with profiling.stage('email/nlon', items=len(lines)):
+        for start in range(0, len(lines), batch_size):
+            text_lines = robjects.StrVector(lines[start:start + batch_size])
+            predictions = robjects.r['as.character'](nlon.NLoNPredict(nlon_model, text_lines))
+            labels.extend(predictions)
+    return labels
+
+
+def _remove_lines_of_code_batch(texts, batch_size=NLON_BATCH_SIZE):
+    """
+    Removes the lines of code from a chunk of messages. The lines of all the messages
+    are classified together and the labels are mapped back to the message they belong to.
+    """
+    with profiling.stage('email/html', items=len(texts)):
+        messages_by_lines = [_strip_html(text).splitlines() for text in texts]
+    all_lines = [line for message_by_lines in messages_by_lines for line in message_by_lines]
+    labels = iter(_classify_lines(all_lines, batch_size))
+    clean_message_bodies = list()
+    for message_by_lines in messages_by_lines:
+        kept_lines = [line for line in message_by_lines if next(labels) != 'Not']
+        clean_message_bodies.append('\n'.join(kept_lines).strip())
+    return clean_message_bodies
+
+
+def _remove_lines_of_code(text, batch_size=NLON_BATCH_SIZE):
+    return _remove_lines_of_code_batch([text], batch_size)[0]
 
 
 def hash_score_email_addresses():
@@ -234,37 +296,171 @@ def _remove_contractions(text):
     return res
 
 
-def get_mail_corpus():
-    # Path to mail corpus
-    corpus_file = 'dataset/raw/mailcorpus.json'
-    with open(corpus_file) as data_file:
-        corpus = json.load(data_file)
+def cleaning_fingerprint():
+    """
+    Fingerprint of the cleaning configuration: the cached bodies are reused only if
+    the version, the clean-text options, the stop words, the punctuation and the NLoN
+    training data are the same.
+    """
+    sha = hashlib.sha256()
+    config = {'version': CLEANING_VERSION, 'clean_text': CLEAN_TEXT_OPTIONS, 'punctuation': punc,
+              'stop_words': sorted(get_stop_words())}
+    sha.update(json.dumps(config, sort_keys=True).encode())
+    with open(file=NLON_TRAINING_DATA, mode='rb') as f:
+        sha.update(f.read())
+    return sha.hexdigest()
 
-    print('Reading and cleaning emails corpus. Number of emails: ' + str(len(corpus)))
-    _dict = {}
-    n = 0
-    # Text cleaning
-    for d in corpus:
-        try:
-            res = EmailReplyParser.read(d['message_body'].replace('\\n', '\n'))
-            clean_message_body = EmailReplyParser.parse_reply(res.text)
-            n += 1
 
+def _clean_messages(messages, batch_size=NLON_BATCH_SIZE):
+    """
+    Cleans a chunk of (email_address, key, message_body) triples and returns the
+    (email_address, key, clean_message_body) triples of the messages successfully
+    parsed. The body is empty for the messages left with no content.
+    """
+    from email_reply_parser import EmailReplyParser
+    parsed = list()
+    with profiling.stage('email/reply_parsing', items=len(messages)):
+        for address, key, body in messages:
+            try:
+                res = EmailReplyParser.read(body.replace('\\n', '\n'))
+                parsed.append((address, key, EmailReplyParser.parse_reply(res.text)))
+            except Exception as e:
+                print(e)
+
+    try:
+        bodies = _remove_lines_of_code_batch([body for _, _, body in parsed], batch_size)
+    except ImportError:
+        raise
+    except Exception as e:
+        print(e)
+        # the messages are classified one at a time, so that only the ones failing are left out
+        bodies = list()
+        for _, _, body in parsed:
+            try:
+                bodies.append(_remove_lines_of_code(body, batch_size))
+            except ImportError:
+                raise
+            except Exception as e:
+                print(e)
+                bodies.append(None)
+
+    cleaned = list()
+    for (address, key, _), clean_message_body in zip(parsed, bodies):
+        if clean_message_body is None:
+            continue
+        try:
             #clean_message_body = _remove_contractions(clean_message_body)
-            clean_message_body = _remove_lines_of_code(clean_message_body)
             clean_message_body = _clean_body(clean_message_body)
             clean_message_body = _remove_stopwords_nonenglish_punctuation(clean_message_body)
-
-            if not clean_message_body == '':
-                if d['email_address'] in _dict:
-                    _dict[d['email_address']].add(clean_message_body)
-                else:
-                    _dict[d['email_address']] = {clean_message_body}
-            print(str(n) + '/' + str(len(corpus)) + '\n' if n % 50 == 0 else '', end='')
+        except ImportError:
+            # a missing cleaning library, imported on first use, must not be taken for a bad message
+            raise
         except Exception as e:
             print(e)
             continue
+        cleaned.append((address, key, clean_message_body))
+    return cleaned
+
+
+def get_mail_corpus(batch_size=NLON_BATCH_SIZE, chunk_size=CHUNK_SIZE, workers=1, cache_path=CACHE_PATH,
+                    dedup=None):
+    """
+    With workers > 1, the corpus is split in chunks of chunk_size messages that are cleaned
+    by a pool of processes, see utils.pool. Each worker starts its own R session, on its first
+    chunk, and reads the NLoN model saved on disk.
+    Messages whose body has already been cleaned with the same configuration are read
+    from the cache in cache_path instead. If a Deduplicator is given (see utils.email.dedup),
+    the near-duplicates of earlier messages are dropped before the cleaning, and recorded in it.
+    """
+    # Path to mail corpus, emails are streamed one chunk at a time
+    corpus_file = 'dataset/raw/mailcorpus.json'
+    corpus = iter_json_array(corpus_file)
+
+    print('Reading and cleaning emails corpus')
+    start, start_cpu = time.perf_counter(), time.thread_time()
+    _dict = {}
+    n = 0
+    n_read = 0
+    n_cached = 0
+
+    def add(address, clean_message_body):
+        if not clean_message_body == '':
+            if address in _dict:
+                _dict[address].add(clean_message_body)
+            else:
+                _dict[address] = {clean_message_body}
+
+    def collect(result):
+        nonlocal n
+        cleaned, stats = result if pool else (result, {})
+        profiling.merge(stats)
+        n += len(cleaned)
+        for address, _, clean_message_body in cleaned:
+            add(address, clean_message_body)
+        if cache:
+            cache.put_many((key, clean_message_body) for _, key, clean_message_body in cleaned)
+        print(str(n) + '/' + str(n_read) + '\n', end='')
+
+    fingerprint = cleaning_fingerprint()
+    cache = CleanedBodyCache(cache_path, fingerprint) if cache_path else None
+    clean_chunk = partial(_clean_messages, batch_size=batch_size)
+    if workers > 1:
+        clean_chunk = Profiled(clean_chunk)
+    if workers > 1 and not os.path.exists(nlon_model_path()):
+        # trained once here, rather than by each worker
+        load_nlon()
+    pool = spawn_pool(workers) if workers > 1 else None
+    in_flight = deque()
+    try:
+        # Text cleaning, the lines of chunk_size messages at a time are sent to NLoN
+        while True:
+            chunk = list(islice(corpus, chunk_size))
+            if not chunk:
+                break
+            n_read += len(chunk)
+            messages = list()
+            for d in chunk:
+                try:
+                    messages.append((d['email_address'], body_hash(d['message_body']), d['message_body']))
+                except Exception as e:
+                    print(e)
+            if dedup:
+                with profiling.stage('email/dedup', items=len(messages)):
+                    messages = [m for m in messages if not dedup.is_duplicate(m[0], m[2], m[1])]
+            if cache:
+                with profiling.stage('email/cache_lookup', items=len(messages)):
+                    cached = cache.get_many(key for _, key, _ in messages)
+                n_hits = 0
+                for address, key, _ in messages:
+                    if key in cached:
+                        add(address, cached[key])
+                        n_hits += 1
+                # messages, rather than distinct bodies, read from the cache
+                n += n_hits
+                n_cached += n_hits
+                messages = [m for m in messages if m[1] not in cached]
+            if not messages:
+                continue
+            if pool:
+                in_flight.append(pool.apply_async(clean_chunk, (messages,)))
+                while len(in_flight) > 2 * workers:
+                    collect(in_flight.popleft().get())
+            else:
+                collect(clean_chunk(messages))
+        while in_flight:
+            collect(in_flight.popleft().get())
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        if cache:
+            cache.close()
+    profiling.add('email/get_mail_corpus', time.perf_counter() - start, time.thread_time() - start_cpu, n_read,
+                  peak_rss=profiling.peak_rss_mb())
 
-    print('Mails retrieved: ' + str(n))
+    print('Number of emails: ' + str(n_read))
+    if dedup:
+        print('Near-duplicates dropped: ' + str(len(dedup.dropped)))
+    print('Mails retrieved: ' + str(n) + ' (' + str(n_cached) + ' from cache)')
     print('Email addresses: ' + str(len(_dict)))
     return _dict
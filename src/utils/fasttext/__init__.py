@@ -0,0 +1,78 @@
+"""
+Binary store of the FastText embeddings used by TwitPersonality. The text .vec file is converted once into a
+float32 matrix (.npy), memory-mapped at startup and shared by all the processes reading it, plus the vocabulary
+(.vocab, one word per line, in the order of the matrix rows).
+"""
+import os
+from collections.abc import Mapping
+
+import numpy as np
+
+from utils.io.files import atomic_save, convert_once
+
+VEC_PATH = "twitpersonality/FastText/dataset.vec"
+
+
+def _store_paths(vec_path):
+    base = os.path.splitext(vec_path)[0]
+    return base + '.npy', base + '.vocab'
+
+
+def convert_vec(vec_path=VEC_PATH):
+    """Converts the .vec file, whose first line holds the number of words and the vector size"""
+    matrix_path, vocab_path = _store_paths(vec_path)
+    words = list()
+
+    def write_matrix(tmp_path):
+        with open(file=vec_path, mode='r', encoding='utf-8', errors='ignore') as f:
+            header = f.readline().split()
+            if len(header) != 2:
+                raise ValueError("Missing header with the number of words and the vector size in {}".format(vec_path))
+            n_words, dim = int(header[0]), int(header[1])
+            matrix = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(n_words, dim))
+            for line in f:
+                values = line.rstrip().split(' ')
+                if len(values) != dim + 1 or len(words) == n_words:
+                    continue
+                matrix[len(words)] = np.asarray(values[1:], dtype=np.float32)
+                words.append(values[0])
+            matrix.flush()
+            del matrix
+
+    def write_vocab(tmp_path):
+        with open(file=tmp_path, mode='w', encoding='utf-8') as f:
+            f.write('\n'.join(words))
+
+    atomic_save(matrix_path, write_matrix)
+    atomic_save(vocab_path, write_vocab)
+
+
+class FastTextStore(Mapping):
+    """
+    Read-only mapping from words to their embedding, backed by the memory-mapped matrix.
+    It can be used wherever the dict returned by datasetUtils.parseFastText is expected.
+    """
+
+    def __init__(self, vec_path=VEC_PATH):
+        matrix_path, vocab_path = _store_paths(vec_path)
+        self.vectors = np.load(matrix_path, mmap_mode='r')
+        with open(file=vocab_path, mode='r', encoding='utf-8') as f:
+            self._index = {word: i for i, word in enumerate(f.read().split('\n'))}
+
+    def __getitem__(self, word):
+        return self.vectors[self._index[word]]
+
+    def __contains__(self, word):
+        return word in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+
+def load_fasttext(vec_path=VEC_PATH):
+    """Returns the store of the embeddings in vec_path, converting them first if missing or outdated"""
+    convert_once(vec_path, _store_paths(vec_path), convert_vec)
+    return FastTextStore(vec_path)
@@ -1,19 +1,38 @@
+"""
+Input and output of the datasets. Only NumPy is imported with the package, so that the workers cleaning the emails
+or scoring the users load quickly: pandas is imported by the functions returning DataFrames.
+"""
 import json
 
-import pandas as pd
+from utils.io.goldstandard import GoldStandard
+from utils.io.jsonstream import iter_json_array, iter_json_object
+from utils.io.mailcorpus import MailCorpus, store_path as mailcorpus_store_path, write_store
 
 GOLDSTANDARD_PATH = 'dataset/goldstandard/ipip-scores-sha.json'
+MAILCORPUS_PATH = 'dataset/goldstandard/mailcorpus-sha.json'
+
+
+def load_gold_standard_store(mmap_mode='r'):
+    """Gold standard indexed by hashed address, see utils.io.goldstandard"""
+    return GoldStandard(GOLDSTANDARD_PATH, mmap_mode=mmap_mode)
 
 
 def load_gold_standard():
-    with open(file=GOLDSTANDARD_PATH, mode='r') as js_f:
-        gs = json.load(js_f)
-    gold_standard = pd.DataFrame.from_dict(gs)
-    gold_standard = gold_standard.drop(columns=['id_test', 'time'])
-    return gold_standard
+    return load_gold_standard_store().to_frame()
+
+
+def load_mail_corpus(mmap_mode='r'):
+    """Hashed mail corpus, mapping each hashed address to its messages, see utils.io.mailcorpus"""
+    return MailCorpus(MAILCORPUS_PATH, mmap_mode=mmap_mode)
+
+
+def store_mail_corpus(corpus):
+    """Writes the columnar store of the hashed mail corpus from its (hashed address, messages) pairs"""
+    write_store(corpus, mailcorpus_store_path(MAILCORPUS_PATH))
 
 
 def load_csv_into_df(path, sep=',', decimal='.'):
+    import pandas as pd
     return pd.read_csv(path, sep=sep, decimal=decimal)
 
 
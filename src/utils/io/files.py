@@ -0,0 +1,42 @@
+"""
+Files derived from the dataset, e.g., the binary stores converted from the JSON files or the trained NLoN model.
+They are written under a temporary name, unique to the process, and then moved in place, so that a concurrent reader
+(another stage of the pipeline, or a worker process) never sees a partial file: it reads either the previous version,
+whose open files are kept, or the new one.
+"""
+import os
+import shutil
+
+
+def atomic_save(path, writer):
+    """Calls writer(tmp_path), which writes a file or a directory, and moves it to path"""
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        writer(tmp_path)
+        if os.path.isdir(tmp_path) and os.path.exists(path):
+            # a directory cannot replace another one, the old one is moved away first
+            old_path = '{}.{}.old'.format(path, os.getpid())
+            os.replace(path, old_path)
+            os.replace(tmp_path, path)
+            shutil.rmtree(old_path, ignore_errors=True)
+        else:
+            os.replace(tmp_path, path)
+    finally:
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        elif os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def is_outdated(paths, source):
+    """True if any of paths is missing, or older than the source they are derived from, if it exists"""
+    if not all(os.path.exists(path) for path in paths):
+        return True
+    return os.path.exists(source) and min(os.path.getmtime(path) for path in paths) < os.path.getmtime(source)
+
+
+def convert_once(source, paths, convert, kind='binary store'):
+    """Runs convert(source), which writes paths, unless they are up to date, see is_outdated()"""
+    if is_outdated(paths, source):
+        print("Converting {} into a {}, it is done only once".format(source, kind))
+        convert(source)
@@ -0,0 +1,109 @@
+"""
+Gold standard store indexed by hashed email address. The JSON file is converted once into a NumPy structured
+array (.npy) sorted by address, which is memory-mapped by the tool scripts. Lookups and joins are done with
+binary searches on the sorted addresses, so no script has to parse and sort the JSON file again.
+"""
+import json
+import os
+
+import numpy as np
+
+from utils.io.files import atomic_save, convert_once
+
+# Trait columns, in the order of the JSON file
+TRAIT_COLUMNS = ('extraversion', 'conscientiousness', 'agreeableness', 'openness', 'neuroticism')
+
+
+def _store_path(json_path):
+    return os.path.splitext(json_path)[0] + '.npy'
+
+
+def convert_json(json_path):
+    """
+    Converts the gold standard into the binary store. Entries keep their position in the JSON file,
+    so that respondents who took the test more than once are all kept, in the original order.
+    """
+    with open(file=json_path, mode='r') as js_f:
+        gs = json.load(js_f)
+    emails = np.array([d['email'].encode('utf-8') for d in gs], dtype=bytes)
+    dtype = [('email', emails.dtype), ('position', np.int64)] + [(trait, np.float64) for trait in TRAIT_COLUMNS]
+    records = np.empty(len(gs), dtype=dtype)
+    records['email'] = emails
+    records['position'] = np.arange(len(gs))
+    for trait in TRAIT_COLUMNS:
+        records[trait] = [d[trait] for d in gs]
+    records = records[np.argsort(records['email'], kind='stable')]
+
+    def save(tmp_path):
+        # np.save() would append .npy to a file name
+        with open(file=tmp_path, mode='wb') as f:
+            np.save(f, records)
+
+    atomic_save(_store_path(json_path), save)
+
+
+class GoldStandard:
+    def __init__(self, json_path, mmap_mode='r'):
+        store_path = _store_path(json_path)
+        convert_once(json_path, [store_path], convert_json)
+        self.records = np.load(store_path, mmap_mode=mmap_mode)
+        self._index = None
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, email):
+        return email in self._email_index()
+
+    def _email_index(self):
+        # built on the first lookup: email -> (first, last + 1) rows of its entries
+        if self._index is None:
+            emails = [e.decode('utf-8') for e in self.records['email']]
+            self._index = dict()
+            for row, email in enumerate(emails):
+                first, _ = self._index.get(email, (row, row))
+                self._index[email] = (first, row + 1)
+        return self._index
+
+    def lookup(self, email):
+        """Returns the (entries x traits) scores of an address, raises KeyError if it is not in the gold standard"""
+        first, last = self._email_index()[email]
+        return np.column_stack([self.records[trait][first:last] for trait in TRAIT_COLUMNS])
+
+    def match(self, emails):
+        """
+        Returns two arrays of row indices pairing each of the given emails with all of its gold standard
+        entries, as an inner join would. Emails missing from the gold standard are left out.
+        """
+        keys = np.array([e.encode('utf-8') for e in emails], dtype=bytes)
+        column = self.records['email']
+        first = np.searchsorted(column, keys, side='left')
+        counts = np.searchsorted(column, keys, side='right') - first
+        query_rows = np.repeat(np.arange(len(keys)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return query_rows, np.repeat(first, counts) + offsets
+
+    def join(self, results):
+        """Inner join of a DataFrame with an email column and the gold standard scores"""
+        query_rows, gold_rows = self.match(results['email'])
+        joined = results.iloc[query_rows].reset_index(drop=True)
+        for trait in TRAIT_COLUMNS:
+            joined[trait] = self.records[trait][gold_rows]
+        return joined
+
+    def select(self, emails):
+        """DataFrame of the entries of the given emails, in the order of the gold standard file"""
+        _, gold_rows = self.match(set(emails))
+        return self._frame(gold_rows)
+
+    def to_frame(self):
+        """DataFrame of all the entries, as loaded from the JSON file"""
+        return self._frame(np.arange(len(self.records)))
+
+    def _frame(self, rows):
+        import pandas as pd
+        rows = rows[np.argsort(self.records['position'][rows], kind='stable')]
+        records = self.records[rows]
+        df = pd.DataFrame({trait: records[trait] for trait in TRAIT_COLUMNS})
+        df.insert(0, 'email', [e.decode('utf-8') for e in records['email']])
+        return df
@@ -0,0 +1,108 @@
+"""
+Streaming readers of JSON files too large to be loaded at once, e.g., the raw mail corpus. They only depend on
+the standard library, so that the cleaning workers can read the corpus without importing pandas.
+"""
+import json
+
+# Number of characters read at a time by the streaming JSON readers
+READ_SIZE = 1 << 16
+
+
+def iter_json_array(path):
+    """
+    Yields the elements of the top-level JSON array stored in path one at a time, so that
+    memory is bounded by the largest element rather than by the file size. JSON Lines files
+    (.jsonl) are read one line, i.e., one element, at a time.
+    """
+    if path.endswith('.jsonl'):
+        yield from _iter_json_lines(path)
+    else:
+        yield from _iter_json_container(path, '[')
+
+
+def iter_json_object(path):
+    """
+    Yields the (key, value) pairs of the top-level JSON object stored in path one at a time.
+    In JSON Lines files (.jsonl), each line is an object holding one or more pairs.
+    """
+    if path.endswith('.jsonl'):
+        for obj in _iter_json_lines(path):
+            yield from obj.items()
+    else:
+        yield from _iter_json_container(path, '{')
+
+
+def _iter_json_lines(path):
+    with open(file=path, mode='r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+# Characters that can follow a complete JSON value in a container
+_DELIMITERS = frozenset(' \t\n\r,:]}')
+
+
+def _iter_json_container(path, opening):
+    closing = ']' if opening == '[' else '}'
+    decoder = json.JSONDecoder()
+    with open(file=path, mode='r', encoding='utf-8') as f:
+        buf = ''
+        pos = 0
+        eof = False
+
+        def read_more():
+            nonlocal buf, pos, eof
+            # read at least as much as already buffered, to parse large values in linear time;
+            # what has been parsed already is only dropped here, where the buffer is copied anyway
+            chunk = f.read(max(READ_SIZE, len(buf) - pos))
+            buf = buf[pos:] + chunk
+            pos = 0
+            eof = not chunk
+
+        def next_char():
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in ' \t\n\r':
+                    pos += 1
+                if pos < len(buf):
+                    return buf[pos]
+                if eof:
+                    raise json.JSONDecodeError('Unexpected end of file', buf, pos)
+                read_more()
+
+        def expect(char):
+            nonlocal pos
+            if next_char() != char:
+                raise json.JSONDecodeError('Expecting \'{}\''.format(char), buf, pos)
+            pos += 1
+
+        def decode():
+            nonlocal pos
+            next_char()
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                    # a value not followed by a delimiter might be truncated, e.g., '0.' of '0.5'
+                    if eof or (end < len(buf) and buf[end] in _DELIMITERS):
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                read_more()
+
+        expect(opening)
+        first = True
+        while True:
+            if next_char() == closing:
+                return
+            if not first:
+                expect(',')
+            first = False
+            if opening == '[':
+                yield decode()
+            else:
+                key = decode()
+                expect(':')
+                yield key, decode()
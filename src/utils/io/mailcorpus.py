@@ -0,0 +1,117 @@
+"""
+Columnar store of the hashed mail corpus. The JSON file is converted once into a directory of NumPy arrays:
+the hashed addresses of the senders (dictionary), the offsets of the messages of each sender, the offsets of each
+message body, and the UTF-8 bodies in a single contiguous buffer. The arrays are memory-mapped, so the messages
+of a sender are read without parsing the rest of the corpus.
+"""
+import os
+from collections.abc import ItemsView, Mapping
+
+import numpy as np
+
+from utils.io.files import atomic_save, convert_once
+from utils.io.jsonstream import iter_json_object
+
+# invalid code points left by the cleaning are kept as they are
+ENCODING_ERRORS = 'surrogatepass'
+
+
+def store_path(json_path):
+    return os.path.splitext(json_path)[0]
+
+
+def write_store(corpus, path):
+    """
+    Writes the (hashed address, messages) pairs of corpus into a store directory. The bodies are written as
+    they come, so the corpus can be streamed.
+    """
+    atomic_save(path, lambda tmp_path: _write_arrays(corpus, tmp_path))
+
+
+def _write_arrays(corpus, path):
+    os.makedirs(path)
+    senders = list()
+    sender_offsets = [0]
+    message_offsets = [0]
+    with open(file=os.path.join(path, 'bodies.bin'), mode='wb') as f:
+        for hashed_addr, messages in corpus:
+            senders.append(hashed_addr.encode('utf-8'))
+            for message in messages:
+                body = message.encode('utf-8', ENCODING_ERRORS)
+                f.write(body)
+                message_offsets.append(message_offsets[-1] + len(body))
+            sender_offsets.append(len(message_offsets) - 1)
+    senders = np.array(senders, dtype=bytes)
+    np.save(os.path.join(path, 'senders.npy'), senders)
+    np.save(os.path.join(path, 'order.npy'), np.argsort(senders, kind='stable'))
+    np.save(os.path.join(path, 'sender_offsets.npy'), np.array(sender_offsets, dtype=np.int64))
+    np.save(os.path.join(path, 'message_offsets.npy'), np.array(message_offsets, dtype=np.int64))
+
+
+def convert_json(json_path):
+    """Converts the hashed corpus from JSON into the columnar store, streaming one sender at a time"""
+    write_store(iter_json_object(json_path), store_path(json_path))
+
+
+class MailCorpus(Mapping):
+    """
+    Read-only mapping of each hashed address to the list of its messages, iterated in the order of the JSON file.
+    The store is rebuilt when the JSON file is newer, and can be used without it.
+    """
+
+    def __init__(self, json_path, mmap_mode='r'):
+        path = store_path(json_path)
+        convert_once(json_path, [path], convert_json, kind='columnar store')
+        self.senders = np.load(os.path.join(path, 'senders.npy'), mmap_mode=mmap_mode)
+        self.order = np.load(os.path.join(path, 'order.npy'), mmap_mode=mmap_mode)
+        self.sender_offsets = np.load(os.path.join(path, 'sender_offsets.npy'), mmap_mode=mmap_mode)
+        self.message_offsets = np.load(os.path.join(path, 'message_offsets.npy'), mmap_mode=mmap_mode)
+        bodies_path = os.path.join(path, 'bodies.bin')
+        # an empty file cannot be memory-mapped
+        if os.path.getsize(bodies_path) == 0:
+            self.bodies = np.zeros(0, dtype=np.uint8)
+        elif mmap_mode is None:
+            self.bodies = np.fromfile(bodies_path, dtype=np.uint8)
+        else:
+            self.bodies = np.memmap(bodies_path, dtype=np.uint8, mode=mmap_mode)
+
+    def __len__(self):
+        return len(self.senders)
+
+    def __iter__(self):
+        return (sender.decode('utf-8') for sender in self.senders)
+
+    def _position(self, hashed_addr):
+        key = hashed_addr.encode('utf-8')
+        i = np.searchsorted(self.senders, key, sorter=self.order)
+        if i == len(self.order) or self.senders[self.order[i]] != key:
+            return None
+        return self.order[i]
+
+    def __contains__(self, hashed_addr):
+        return isinstance(hashed_addr, str) and self._position(hashed_addr) is not None
+
+    def __getitem__(self, hashed_addr):
+        position = self._position(hashed_addr) if isinstance(hashed_addr, str) else None
+        if position is None:
+            raise KeyError(hashed_addr)
+        return self._messages(position)
+
+    def _messages(self, position):
+        first, last = self.sender_offsets[position], self.sender_offsets[position + 1]
+        offsets = self.message_offsets[first:last + 1]
+        buffer = self.bodies[offsets[0]:offsets[-1]].tobytes()
+        offsets = offsets - offsets[0]
+        return [buffer[start:end].decode('utf-8', ENCODING_ERRORS) for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def items(self):
+        return _MailCorpusItems(self)
+
+
+class _MailCorpusItems(ItemsView):
+    """(hashed address, messages) pairs in the order of the JSON file, read without any lookup"""
+
+    def __iter__(self):
+        corpus = self._mapping
+        for position, sender in enumerate(corpus.senders):
+            yield sender.decode('utf-8'), corpus._messages(position)
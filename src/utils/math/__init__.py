@@ -1,11 +1,30 @@
-import matplotlib.pyplot as plt
+"""
+Statistics of the scores of the tools. Only NumPy and pandas are imported with the module, so that the tool
+scripts load quickly: SciPy, statsmodels and matplotlib are imported by the functions using them.
+"""
+import os
+
+import numpy as np
 import pandas as pd
-import statsmodels.api as sm
-from scipy.stats import shapiro
-from sklearn.metrics import mean_absolute_error, mean_squared_error
+
+from utils import io as io_utils
+from utils import profiling
+from utils.io.goldstandard import GoldStandard
+
+TRAITS = ('Openn', 'Consc', 'Extra', 'Agree', 'Neuro')
+# Gold standard column of each trait
+GOLD_COLUMNS = {'Openn': 'openness', 'Consc': 'conscientiousness', 'Extra': 'extraversion',
+                'Agree': 'agreeableness', 'Neuro': 'neuroticism'}
+# Max number of resampled errors held in memory at once by the bootstrap
+BOOT_CHUNK_ELEMENTS = 1 << 22
 
 
-def qq_plot(tool, o, c, e, a, n):
+def qq_plot(tool, o, c, e, a, n, path=None):
+    import statsmodels.api as sm
+    from utils.plot import pyplot
+    plt = pyplot()
+    if path is None:
+        path = "results/phase1/qqplot_{}.png".format(tool)
     fig = plt.figure()
     fig.suptitle("QQ plot for {} predictions".format(tool))
     fig.tight_layout()
@@ -25,10 +44,12 @@ def qq_plot(tool, o, c, e, a, n):
     ax_n = fig.add_subplot(2, 3, 5)
     ax_n.set_title("Neuroticism")
     sm.qqplot(n, ax=ax_n, line='45')
-    fig.savefig("results/phase1/qqplot_{}.png".format(tool), format="png")
+    fig.savefig(path, format="png")
+    plt.close(fig)
 
 
 def test_normal_distribution(data, alpha=0.05):
+    from scipy.stats import shapiro
     stat, p = shapiro(data)
     if p > alpha:
         is_normal = True
@@ -37,18 +58,75 @@ def test_normal_distribution(data, alpha=0.05):
     return is_normal, stat, p
 
 
-def rescale(res_df, old_min, old_max, new_min=1, new_max=5):
-    res_5point_df = res_df.copy(deep=True)
-    for col_name in ('Openn', 'Consc', 'Extra', 'Agree', 'Neuro'):
-        new_values = list()
-        col = res_5point_df[col_name]
-        for x in col:
-            r_x = _rescale(x, old_min, old_max, new_min, new_max)
-            new_values.append(r_x)
-        res_5point_df[col_name] = new_values
+def test_normal_distributions(data, alpha=0.05):
+    """
+    Shapiro-Wilk test of all the samples in data at once, each sample lying along the last axis.
+    Returns the arrays of the verdicts, statistics and p-values, of shape data.shape[:-1].
+    """
+    from scipy.stats import shapiro
+    data = np.asarray(data, dtype=float)
+    try:
+        stat, p = shapiro(data, axis=-1)
+    except TypeError:
+        # versions of scipy without the axis argument
+        results = np.apply_along_axis(lambda x: np.asarray(shapiro(x)), -1, data)
+        stat, p = results[..., 0], results[..., 1]
+    stat, p = np.asarray(stat), np.asarray(p)
+    return p > alpha, stat, p
+
+
+def rank_scores(scores):
+    """Ranks of the scores along the last axis (ties get their average rank), as used by Spearman's correlation"""
+    from scipy.stats import rankdata
+    return rankdata(scores, axis=-1)
+
+
+def correlation_matrices(scores, method='pearson', ranks=None):
+    """
+    Returns the (... x tool x tool) correlation matrices of a (... x tool x subject) array of scores, e.g.,
+    of all the traits at once. Spearman's correlation is Pearson's correlation of the ranks, which are
+    computed here unless passed. Samples with missing values are left to pandas, which drops them pairwise.
+    """
+    scores = np.asarray(scores, dtype=float)
+    if method == 'spearman':
+        data = rank_scores(scores) if ranks is None else ranks
+    elif method == 'pearson':
+        data = scores
+    else:
+        raise ValueError("Unknown correlation method: {}".format(method))
+    if np.isnan(scores).any():
+        samples = np.reshape(scores, (-1,) + scores.shape[-2:])
+        matrices = [pd.DataFrame(sample.T).corr(method=method).to_numpy() for sample in samples]
+        return np.reshape(matrices, scores.shape[:-1] + scores.shape[-2:-1])
+    centered = data - data.mean(axis=-1, keepdims=True)
+    cov = centered @ np.swapaxes(centered, -1, -2)
+    norms = np.sqrt(np.diagonal(cov, axis1=-2, axis2=-1))
+    # constant samples have no correlation, rather than one computed from the rounding errors of the mean
+    norms[np.ptp(data, axis=-1) == 0] = np.nan
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = cov / (norms[..., :, None] * norms[..., None, :])
+    return np.clip(corr, -1, 1)
+
+
+def rescale(res_df, old_min, old_max, new_min=1, new_max=5, inplace=False):
+    """
+    Rescales the five trait columns in a single vectorized operation. Each bound is either a
+    scalar or a per-trait mapping (e.g., {'Openn': 0, ...}). With inplace=True, res_df is
+    modified and returned instead of being deep-copied first.
+    """
+    res_5point_df = res_df if inplace else res_df.copy(deep=True)
+    values = res_5point_df[list(TRAITS)].to_numpy(dtype=float)
+    res_5point_df[list(TRAITS)] = _rescale(values, _trait_bounds(old_min), _trait_bounds(old_max),
+                                          _trait_bounds(new_min), _trait_bounds(new_max))
     return res_5point_df
 
 
+def _trait_bounds(bound):
+    if hasattr(bound, 'keys'):
+        return np.array([bound[trait] for trait in TRAITS], dtype=float)
+    return bound
+
+
 def _rescale(x, old_min, old_max, new_min, new_max):
     x_rescaled = (new_max - new_min) * (x - old_min) / (old_max - old_min) + new_min
     return x_rescaled
@@ -66,6 +144,89 @@ def _setup_dataset(goldstd, results):
     return merged_dataset
 
 
+def align(results, goldstd):
+    """
+    Merges the results with the gold standard (a DataFrame, or the indexed store returned by
+    utils.io.load_gold_standard_store) once, and returns two (subjects x traits) arrays
+    with the predicted and the gold standard scores, traits being in the order of TRAITS.
+    """
+    if isinstance(goldstd, GoldStandard):
+        merged_dataset = goldstd.join(results)
+    else:
+        merged_dataset = _setup_dataset(goldstd, results)
+    predicted = merged_dataset[list(TRAITS)].to_numpy(dtype=float)
+    gold = merged_dataset[[GOLD_COLUMNS[trait] for trait in TRAITS]].to_numpy(dtype=float)
+    return predicted, gold
+
+
+def _error_metrics(errors, axis):
+    mse = np.mean(errors ** 2, axis=axis)
+    return {'mae': np.mean(np.abs(errors), axis=axis),
+            'mse': mse,
+            'rmse': np.sqrt(mse),
+            'bias': np.mean(errors, axis=axis)}
+
+
+def evaluate(results, goldstd, n_boot=0, confidence=0.95, seed=None, decimals=3):
+    """
+    Computes the MAE, MSE, RMSE and bias (mean signed error) of all the traits in one pass over the
+    aligned scores, and returns a dict mapping each metric to a {trait: value} dict.
+
+    If n_boot > 0, the bootstrap confidence intervals of each metric are added as '<metric>_ci',
+    mapping each trait to its [lower, upper] bounds. The resamples are drawn as (resamples x subjects)
+    matrices of indices, evaluated at once in chunks of at most BOOT_CHUNK_ELEMENTS resampled errors.
+    The metrics and their intervals are NaN if no subject of the results is in the gold standard.
+    """
+    with profiling.stage('metrics/align') as record:
+        predicted, gold = align(results, goldstd)
+        record.items = len(predicted)
+    with profiling.stage('metrics/errors', items=len(predicted)):
+        errors = predicted - gold
+        metrics = _error_metrics(errors, axis=0)
+        evaluation = {name: _by_trait(values, decimals) for name, values in metrics.items()}
+    if n_boot > 0 and len(errors) == 0:
+        # no subject to resample, the intervals are undefined, as the metrics
+        evaluation.update({name + '_ci': {trait: [float('nan')] * 2 for trait in TRAITS} for name in metrics})
+    elif n_boot > 0:
+        with profiling.stage('metrics/bootstrap', items=n_boot):
+            evaluation.update(_bootstrap_intervals(errors, n_boot, confidence, seed, decimals))
+    return evaluation
+
+
+def _bootstrap_intervals(errors, n_boot, confidence, seed, decimals):
+    rng = np.random.default_rng(seed)
+    chunk_size = max(1, BOOT_CHUNK_ELEMENTS // max(errors.size, 1))
+    chunks = list()
+    for start in range(0, n_boot, chunk_size):
+        indices = rng.integers(0, len(errors), size=(min(chunk_size, n_boot - start), len(errors)))
+        chunks.append(_error_metrics(errors[indices], axis=1))
+    boot_metrics = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+    tail = (1 - confidence) / 2 * 100
+    intervals = dict()
+    for name, values in boot_metrics.items():
+        lower, upper = np.percentile(values, [tail, 100 - tail], axis=0)
+        intervals[name + '_ci'] = {trait: [round(float(lo), decimals), round(float(up), decimals)]
+                                   for trait, lo, up in zip(TRAITS, lower, upper)}
+    return intervals
+
+
+def store_evaluation(results, goldstd, results_dir):
+    """
+    Evaluates the scores of a tool against the gold standard, see evaluate(), and stores the scores and
+    the errors in results_dir as results.json, mae.json and rmse.json. Note that rmse.json holds the mean
+    squared error, not its root, as it always has, so that the results stay comparable with earlier runs.
+    """
+    errors = evaluate(results, goldstd)
+    io_utils.store_results(os.path.join(results_dir, 'mae.json'), errors['mae'],
+                           os.path.join(results_dir, 'rmse.json'), errors['mse'],
+                           os.path.join(results_dir, 'results.json'), results)
+    return errors
+
+
+def _by_trait(values, decimals):
+    return {trait: round(float(value), decimals) for trait, value in zip(TRAITS, values)}
+
+
 def compute_mae(results, goldstd):
     """
     $\mathrm{MAE}=\frac{1}{n} \sum_{i=1}^{n}\left|y_{i}-x_{i}\right|$
@@ -75,28 +236,12 @@ def compute_mae(results, goldstd):
     score, which means that all individual differences are weighted
     equally on the average.
     """
-    merged_dataset = _setup_dataset(goldstd, results)
-    """
-    The Mean Absolute Error is calculated using the scikit function 
-    (https://scikit-learn.org/stable/modules/generated/sklearn.metrics.mean_absolute_error.html)
-    and then stored in a list.
-    """
-    mae = dict()
-    mae['Openn'] = round(mean_absolute_error(merged_dataset['openness'], merged_dataset['Openn']), 3)
-    mae['Consc'] = round(mean_absolute_error(merged_dataset['conscientiousness'], merged_dataset['Consc']), 3)
-    mae['Extra'] = round(mean_absolute_error(merged_dataset['extraversion'], merged_dataset['Extra']), 3)
-    mae['Agree'] = round(mean_absolute_error(merged_dataset['agreeableness'], merged_dataset['Agree']), 3)
-    mae['Neuro'] = round(mean_absolute_error(merged_dataset['neuroticism'], merged_dataset['Neuro']), 3)
-    return mae
+    return evaluate(results, goldstd)['mae']
 
 
 def compute_rmse(results, goldstd):
-    merged_dataset = _setup_dataset(goldstd, results)
-    rmse = dict()
-    rmse['Openn'] = round(mean_squared_error(merged_dataset['Openn'], merged_dataset['openness'], squared=True), 3)
-    rmse['Consc'] = round(
-        mean_squared_error(merged_dataset['Consc'], merged_dataset['conscientiousness'], squared=True), 3)
-    rmse['Extra'] = round(mean_squared_error(merged_dataset['Extra'], merged_dataset['extraversion'], squared=True), 3)
-    rmse['Agree'] = round(mean_squared_error(merged_dataset['Agree'], merged_dataset['agreeableness'], squared=True), 3)
-    rmse['Neuro'] = round(mean_squared_error(merged_dataset['Neuro'], merged_dataset['neuroticism'], squared=True), 3)
-    return rmse
+    """
+    Kept for compatibility: as the rmse.json files produced so far, it returns the mean squared
+    error (i.e., mean_squared_error with squared=True), use evaluate() for the actual RMSE.
+    """
+    return evaluate(results, goldstd)['mse']
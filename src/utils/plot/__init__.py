@@ -1,8 +1,26 @@
-import matplotlib.pyplot as plt
+import hashlib
+import json
+import os
+
 import numpy as np
 
+from utils.math import qq_plot
+from utils.pool import spawn_pool
+
+# Bump whenever the plots change, so that they are rendered again
+PLOT_VERSION = 1
+
+
+def pyplot():
+    """matplotlib.pyplot on a non-interactive backend, since figures are only saved to files, imported on first use"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
 
 def save_violins_plot(openness, conscientiousness, extraversion, agreeableness, neuroticism, path):
+    plt = pyplot()
     fig, axes = plt.subplots()
     axes.violinplot(dataset=[openness, conscientiousness, extraversion, agreeableness, neuroticism], showmeans=True)
     xticklabels = ['Ope', 'Con', 'Ext', 'Agr', 'Neu']
@@ -10,4 +28,50 @@ def save_violins_plot(openness, conscientiousness, extraversion, agreeableness,
     axes.set_xticklabels(xticklabels)
     axes.set_yticks(np.arange(1, 5.5, step=0.5))  # Set label locations.
     axes.yaxis.grid(True)
-    plt.savefig(path)
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def _render(task):
+    kind, tool, scores, path = task
+    if kind == 'qq':
+        qq_plot(tool, *scores, path=path)
+    elif kind == 'violins':
+        save_violins_plot(*scores, path)
+    else:
+        raise ValueError("Unknown plot: {}".format(kind))
+    return path
+
+
+def data_hash(kind, tool, scores):
+    scores = np.ascontiguousarray(scores, dtype=float)
+    sha = hashlib.sha256(json.dumps([PLOT_VERSION, kind, tool, scores.shape]).encode())
+    sha.update(scores.tobytes())
+    return sha.hexdigest()
+
+
+def render_plots(tasks, workers=1, manifest_path=None):
+    """
+    Renders the (kind, tool, scores, path) plot tasks, where kind is 'qq' or 'violins' and scores holds
+    the five traits, in a pool of worker processes if workers > 1. The hash of the data of each plot is
+    recorded in manifest_path, and the plots whose data did not change since are skipped, as long as
+    their file exists. Returns the paths of the plots rendered.
+    """
+    manifest = dict()
+    if manifest_path and os.path.exists(manifest_path):
+        with open(file=manifest_path, mode='r') as js_f:
+            manifest = json.load(js_f)
+    hashes = {task[3]: data_hash(*task[:3]) for task in tasks}
+    todo = [task for task in tasks if not (manifest.get(task[3]) == hashes[task[3]] and os.path.exists(task[3]))]
+
+    if workers > 1 and len(todo) > 1:
+        with spawn_pool(min(workers, len(todo))) as pool:
+            rendered = pool.map(_render, todo)
+    else:
+        rendered = [_render(task) for task in todo]
+
+    if manifest_path:
+        manifest.update((path, hashes[path]) for path in rendered)
+        with open(file=manifest_path, mode='w') as js_f:
+            json.dump(manifest, js_f, indent=4)
+    return rendered
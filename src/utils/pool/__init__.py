@@ -0,0 +1,24 @@
+"""
+Process pools of the pipeline. Workers are spawned rather than forked: the pipeline runs its stages from threads,
+and a process forked from a multi-threaded one may inherit locks held by the other threads, and deadlock. A spawned
+worker starts from a fresh interpreter, so it loads its own resources, e.g., its R session or memory-mapped stores.
+Tasks wrapped in Profiled send the profiling records of the worker back with their result, see utils.profiling.
+"""
+import multiprocessing
+
+from utils import profiling
+
+
+def spawn_pool(processes, initializer=None, initargs=()):
+    return multiprocessing.get_context('spawn').Pool(processes=processes, initializer=initializer,
+                                                     initargs=initargs)
+
+
+class Profiled:
+    """Picklable task returning the (result, profiling records) pair of func, to be merged by the parent"""
+
+    def __init__(self, func):
+        self.func = func
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs), profiling.take()
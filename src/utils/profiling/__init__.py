@@ -0,0 +1,100 @@
+"""
+Lightweight instrumentation of the pipeline. Stages and hot sub-steps are timed with the stage() context manager,
+which records the number of calls, the wall time, the CPU time of the calling thread, the number of items processed
+and the peak RSS of the process. Records of the worker processes are sent back with their results and merged,
+see take() and merge(). Each script writes the records of its run as a JSON report with write_report().
+"""
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+REPORT_DIR = 'results/profiling'
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Peak resident set size of the process (or of its largest child), in MB"""
+    peak = resource.getrusage(who).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+class StageRecord:
+    """Yielded by Profiler.stage(), the number of items can be set once known"""
+    __slots__ = ('items',)
+
+    def __init__(self, items):
+        self.items = items
+
+
+class Profiler:
+    def __init__(self):
+        self.stats = dict()
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, items=0):
+        record = StageRecord(items)
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield record
+        finally:
+            self.add(name, time.perf_counter() - wall, time.thread_time() - cpu, record.items,
+                     peak_rss=peak_rss_mb())
+
+    def add(self, name, wall, cpu, items=0, calls=1, peak_rss=0.0):
+        with self._lock:
+            stats = self.stats.setdefault(name, {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'items': 0,
+                                                 'peak_rss_mb': 0.0})
+            stats['calls'] += calls
+            stats['wall_s'] += wall
+            stats['cpu_s'] += cpu
+            stats['items'] += items
+            stats['peak_rss_mb'] = max(stats['peak_rss_mb'], peak_rss)
+
+    def take(self):
+        """Returns the records so far and clears them, e.g., to send them from a worker process"""
+        with self._lock:
+            stats, self.stats = self.stats, dict()
+        return stats
+
+    def merge(self, stats):
+        for name, s in stats.items():
+            self.add(name, s['wall_s'], s['cpu_s'], s['items'], s['calls'], s['peak_rss_mb'])
+
+    def report(self):
+        with self._lock:
+            stages = {name: dict(s) for name, s in self.stats.items()}
+        for s in stages.values():
+            s['items_per_s'] = s['items'] / s['wall_s'] if s['items'] and s['wall_s'] > 0 else None
+        return {'argv': sys.argv,
+                'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+                'wall_s': time.perf_counter() - self._start,
+                'cpu_s': time.process_time(),
+                'peak_rss_mb': peak_rss_mb(),
+                'peak_children_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN),
+                'stages': stages}
+
+    def write_report(self, name, report_dir=REPORT_DIR):
+        """Writes the report as <report_dir>/<name>-<start time>.json and returns its path"""
+        os.makedirs(report_dir, exist_ok=True)
+        path = os.path.join(report_dir, '{}-{}.json'.format(
+            name, time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))))
+        with open(file=path, mode='w') as js_f:
+            json.dump(self.report(), js_f, indent=4)
+        print('Profiling report written to {}'.format(path))
+        return path
+
+
+# Profiler of the current process
+profiler = Profiler()
+stage = profiler.stage
+add = profiler.add
+take = profiler.take
+merge = profiler.merge
+write_report = profiler.write_report
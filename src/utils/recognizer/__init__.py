@@ -0,0 +1,84 @@
+"""
+Driver of a resident Personality Recognizer process (recognizer.ResidentRecognizer), which loads the models once
+and scores the documents streamed through its standard input. Features are standardized over all the documents sent
+to the process, as in the corpus analysis mode (-d) of PersonalityRecognizer.sh.
+"""
+import os
+import subprocess
+
+APP_DIR = 'PersonalityRecognizer'
+CLASSPATH = ['.', 'weka-3-4/weka.jar', 'lib/commons-cli-1.0.jar', 'lib/jmrc.jar', 'bin/']
+TRAITS = ('Extra', 'Emoti', 'Agree', 'Consc', 'Openn')
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class ResidentRecognizer:
+    """
+    Use as a context manager:
+
+        with ResidentRecognizer() as recognizer:
+            recognizer.add(documents)
+            scores, errors = recognizer.score()
+    """
+
+    def __init__(self, model=4, self_assessed=True, app_dir=APP_DIR, log_path=None, max_heap='512m'):
+        java_home = os.environ.get('JAVA_HOME')
+        java = os.path.join(java_home, 'bin', 'java') if java_home else 'java'
+        cmd = [java, '-Xmx{}'.format(max_heap), '-classpath', os.pathsep.join(CLASSPATH),
+               'recognizer.ResidentRecognizer', '-m', str(model), '-t', '2' if self_assessed else '1']
+        # the recognizer logs a lot on stderr, which is either discarded or sent to log_path
+        self._log = open(log_path, mode='w') if log_path else subprocess.DEVNULL
+        self._proc = subprocess.Popen(cmd, cwd=app_dir, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                      stderr=self._log, encoding='utf-8')
+        line = self._proc.stdout.readline().strip()
+        if line != 'READY':
+            self.close()
+            raise RuntimeError('Personality Recognizer failed to start: {}'.format(line or 'no output'))
+
+    def add(self, documents):
+        """Sends the (id, text) pairs, their features are computed while the next ones are sent"""
+        for doc_id, text in documents:
+            self._proc.stdin.write('DOC\t{}\t{}\n'.format(doc_id, _escape(text)))
+
+    def score(self, all_documents=False):
+        """
+        Returns a dict mapping the id of each document added since the last call (or of all the
+        documents) to the tuple of its scores, in the order of TRAITS, and a dict mapping the id of
+        the documents that could not be analyzed to the error message.
+        """
+        self._proc.stdin.write('SCORE ALL\n' if all_documents else 'SCORE\n')
+        self._proc.stdin.flush()
+        scores = dict()
+        errors = dict()
+        for line in self._proc.stdout:
+            fields = line.rstrip('\n').split('\t')
+            if fields[0] == 'END':
+                return scores, errors
+            if fields[0] == 'ERROR':
+                errors[fields[1]] = fields[2] if len(fields) > 2 else ''
+            else:
+                scores[fields[0]] = tuple(float(v) for v in fields[1:])
+        raise RuntimeError('Personality Recognizer exited with code {}'.format(self._proc.wait()))
+
+    def reset(self):
+        self._proc.stdin.write('RESET\n')
+
+    def close(self):
+        if self._proc.poll() is None:
+            try:
+                self._proc.stdin.write('QUIT\n')
+                self._proc.stdin.close()
+            except (BrokenPipeError, OSError):
+                pass
+            self._proc.wait()
+        if self._log is not subprocess.DEVNULL:
+            self._log.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()